@@ -0,0 +1,148 @@
+""" Out-of-core selection over data bigger than memory: a raw binary column
+	file (one fixed-size number per element) or a NumPy array such as an
+	np.memmap.  Each level reads its data in sequential chunks: a soft heap
+	picks the pivot from a sample, one pass counts the elements below and
+	equal to it, and a second pass spills the side holding the k-th element to
+	a temporary file (drawing the next level's sample as it goes), until the
+	remainder fits in memory and linear_select.select finishes.
+"""
+
+import functools
+import math
+import os
+import tempfile
+import timeit
+import tracemalloc
+import numpy as np
+from linear_select import choose_pivot, select
+
+"""
+To use:
+
+	x = file_select(k, path, dtype='float64')	==> k-th smallest element of a
+													raw binary file of float64s
+
+	x = file_select(k, np.load(path, mmap_mode='r'))	==> The same over an
+															array
+
+	file_select(k, source, dtype, method=4, chunk=2**20, memory=10**7,
+				sample_size=10**4, tmpdir=None)
+								==> Reads chunk elements at a time, and loads
+									the remainder once at most memory elements
+									are left; spill files go to tmpdir
+"""
+
+
+def read_chunks(source, dtype, n, chunk):
+	# Sequential chunks of the first n elements of source: an array, or the
+	# path of a raw binary file
+	if isinstance(source, np.ndarray):
+		for lo in range(0, n, chunk):
+			yield source[lo:lo + chunk]
+	else:
+		with open(source, 'rb') as f:
+			for lo in range(0, n, chunk):
+				yield np.fromfile(f, dtype=dtype, count=min(chunk, n - lo))
+
+def take(positions, lo, chunk):
+	# Elements of chunk at the (sorted) positions that fall in it, where the
+	# chunk starts at position lo
+	i, j = np.searchsorted(positions, (lo, lo + len(chunk)))
+	return chunk[positions[i:j] - lo]
+
+def file_select(k, source, dtype=None, method=4, chunk=2**20, memory=10**7,
+				sample_size=10**4, tmpdir=None, backend='simplified', seed=None):
+	if isinstance(source, np.ndarray):
+		dtype = source.dtype
+		n = len(source)
+	else:
+		dtype = np.dtype(dtype)
+		n = os.path.getsize(source) // dtype.itemsize
+	if k > n or k < 1:
+		raise Exception('Invalid k value')
+	rng = np.random.default_rng(seed)
+	spill = None
+
+	try:
+		if n > memory:
+			positions = np.sort(rng.integers(0, n, sample_size))
+			lo = 0
+			parts = []
+			for c in read_chunks(source, dtype, n, chunk):
+				parts.append(take(positions, lo, c))
+				lo += len(c)
+			sample = np.concatenate(parts)
+
+		while n > memory:
+			k_s = min(len(sample), max(1, math.ceil(k * len(sample) / n)))
+			pivot = choose_pivot(k_s, sample, method, backend)[0]
+
+			less = 0
+			equal = 0
+			for c in read_chunks(source, dtype, n, chunk):
+				less += np.count_nonzero(c < pivot)
+				equal += np.count_nonzero(c == pivot)
+			if less < k <= less + equal:
+				return pivot
+
+			below = k <= less
+			if below:
+				m = less
+			else:
+				m = n - less - equal
+				k -= less + equal
+			# A level that keeps more than 3/4 of its elements gets a bigger
+			# sample for its successor
+			if m > 3 * n / 4:
+				sample_size *= 2
+
+			positions = np.sort(rng.integers(0, m, sample_size))
+			fd, path = tempfile.mkstemp(suffix='.bin', dir=tmpdir)
+			lo = 0
+			parts = []
+			with os.fdopen(fd, 'wb') as f:
+				for c in read_chunks(source, dtype, n, chunk):
+					side = c[c < pivot] if below else c[c > pivot]
+					side.tofile(f)
+					parts.append(take(positions, lo, side))
+					lo += len(side)
+			sample = np.concatenate(parts)
+			if spill is not None:
+				os.remove(spill)
+			spill = source = path
+			n = m
+
+		if isinstance(source, np.ndarray):
+			arr = np.array(source[:n])
+		else:
+			arr = np.fromfile(source, dtype=dtype, count=n)
+		return select(k, arr, method, backend=backend)
+	finally:
+		if spill is not None:
+			os.remove(spill)
+
+# Run experiment on execution time and peak memory (as traced by tracemalloc)
+# of file_select on a raw binary file of n float64s, against loading the file
+# and calling select
+def run_file_exp(lst_sizes=(10**6, 10**7), p=1/2, method=4, memory=10**5, path='file_select_exp.bin'):
+	data = {'x': list(lst_sizes)}
+
+	for n in lst_sizes:
+		k = max(1, math.ceil(n * p))
+		np.random.random(n).tofile(path)
+		runs = {'file_select': functools.partial(file_select, k, path, 'float64', method, memory=memory),
+				'load_select': lambda: select(k, np.fromfile(path), method)}
+		for name, f in runs.items():
+			tracemalloc.start()
+			t = timeit.timeit(f, number=1)
+			peak = tracemalloc.get_traced_memory()[1]
+			tracemalloc.stop()
+			data.setdefault(name + '_time', []).append(t)
+			data.setdefault(name + '_peak', []).append(peak)
+			print('n', n, name, 'peak', peak, 'bytes', 'time', round(t, 3))
+	os.remove(path)
+
+	return data
+
+if __name__ == '__main__':
+	run_file_exp()
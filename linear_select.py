@@ -1,34 +1,47 @@
-from sheap_simplified import SoftHeap
+import sheap
+import sheap_arena
+import sheap_simplified
+import bisect
 import functools
+import itertools
+import json
+import os
+import platform
 import timeit
+import tracemalloc
 import math
 import numpy as np
 import matplotlib.pyplot as plt
 
-def partition(pivot, lst):
-	L = []
-	R = []
-	for elem in lst:
-		if elem < pivot:
-			L.append(elem)
-		elif elem > pivot:
-			R.append(elem)
+# Soft heap engines that select can build its heaps with.  The arena engine
+# keeps its keys as C doubles, so its pivots (and a select that returns one)
+# are floats even for int input
+BACKENDS = {'simplified': sheap_simplified.SoftHeap,
+			'chazelle': sheap.SoftHeap,
+			'arena': sheap_arena.SoftHeap}
 
-	return (L, R)
+def partition(pivot, lst):
+	# Three-way partition of a list: returns lists of the elements below and
+	# above the pivot, and how many equal it (a rank among those is the pivot)
+	L = [elem for elem in lst if elem < pivot]
+	R = [elem for elem in lst if elem > pivot]
+	return (L, len(lst) - len(L) - len(R), R)
 
-def select(k, lst, method, viz=None):
-	# viz should be a SoftHeapVisualization object
-	if viz:
-		viz.select_record(k, lst, info="input")
+def partition_ndarray(pivot, arr):
+	# Three-way partition of a NumPy array with boolean masks: returns compact
+	# arrays of the elements below and above the pivot, and how many equal it
+	L = arr[arr < pivot]
+	R = arr[arr > pivot]
+	return (L, len(arr) - len(L) - len(R), R)
 
-	n = len(lst)
-	if k > n or n < 1:
-		raise Exception('Invalid k value')
-
-	# Base Case
-	if n <= 3:
-		lst.sort()
-		return lst[k - 1]
+def choose_pivot(k, lst, method, backend='simplified', lo=0, hi=None):
+	# Pick a pivot for selecting the k-th smallest element of lst[lo:hi];
+	# returns the pivot and whether it is certified to be that element.
+	# method is 1-6, a Tuner, or 'auto' for the Tuner calibrated for this
+	# machine.  The range is read in place, never copied
+	if hi is None:
+		hi = len(lst)
+	n = hi - lo
 
 	# # Sanity check
 	# eps = 0
@@ -37,9 +50,17 @@ def select(k, lst, method, viz=None):
 	max_heap = False
 	sample = False
 	pivot = None
+	exact = False
+
+	if method == 'auto':
+		method = auto_tuner()
 
+	# A tuner picks this level's parameters from its cost model
+	if isinstance(method, Tuner):
+		eps, delete_min_calls, max_heap, sample_size = method(k, n)
+		sample = sample_size < n
 	# Simple, using Chazelle's constant value for eps
-	if method == 1:
+	elif method == 1:
 		delete_min_calls = max(1, math.floor(n/3))
 		eps = 1/3
 	# Choose delete_min_calls and eps in ways that leverage soft heap corruption properties
@@ -98,6 +119,7 @@ def select(k, lst, method, viz=None):
 
 		if r_h >= 1/3:
 			sample = True
+			sample_size = math.ceil(n/5)
 			delete_min_calls = max(1, math.floor(n/15))
 			eps = r_h - 1/6
 		else:
@@ -117,49 +139,499 @@ def select(k, lst, method, viz=None):
 
 		if r_h >= 1/3:
 			build_heap = False
-			pivot = np.random.choice(lst)
+			pivot = lst[np.random.randint(lo, hi)]
 		else:
 			delete_min_calls = k_h
 			eps = r_h
 	
 	if build_heap:
-		sheap = SoftHeap(eps)
-		if max_heap:
-			lst_h = [-e for e in lst]
+		# The simplified soft heap has a max-heap mode; the other engines get
+		# a negated copy of lst
+		negate = max_heap and backend != 'simplified'
+		if isinstance(lst, np.ndarray):
+			# A view of the range
+			lst_h = lst[lo:hi]
 			if sample:
-				lst_h = np.random.choice(lst_h, size=math.ceil(n/5), replace=False)
-			for elem in lst_h:
-				sheap.insert(elem)
+				lst_h = lst_h[np.random.choice(n, size=sample_size, replace=False)]
+			if negate:
+				# Unsigned and bool arrays would wrap around when negated
+				if lst_h.dtype.kind in 'ub':
+					lst_h = lst_h.astype(np.int64 if lst_h.dtype.itemsize < 8 else object)
+				lst_h = -lst_h
 		else:
-			lst_h = lst
 			if sample:
-				lst_h = np.random.choice(lst_h, size=math.ceil(n/5), replace=False)
-			for elem in lst_h:
-				sheap.insert(elem)
-
-		max_seen = float('-inf')
-		for i in range(delete_min_calls):
-			ptr, key = sheap.find_min()
-			elem = ptr.key
-			sheap.delete_min()
-			if elem > max_seen:
-				max_seen = elem
-
-		if max_heap:
+				lst_h = [lst[lo + i] for i in np.random.choice(n, size=sample_size, replace=False)]
+			else:
+				lst_h = itertools.islice(lst, lo, hi)
+			if negate:
+				lst_h = [-e for e in lst_h]
+		if max_heap and not negate:
+			sheap = BACKENDS[backend].from_iterable(lst_h, eps, order='max')
+			max_seen = min(sheap.delete_min_many(delete_min_calls))
+		else:
+			sheap = BACKENDS[backend].from_iterable(lst_h, eps)
+			max_seen = max(sheap.delete_min_many(delete_min_calls))
+
+		# If no item left in the heap is corrupted, every one of them is at
+		# least max_seen, so the deleted items are exactly the smallest ones
+		# and max_seen has rank delete_min_calls: when that is the rank we
+		# want, it is the answer and the partition can be skipped
+		k_heap = n - k + 1 if max_heap else k
+		exact = not sample and sheap.num_corrupted == 0 and delete_min_calls == k_heap
+
+		if negate:
 			max_seen = -max_seen
 
 		pivot = max_seen
 
-	L, R = partition(pivot, lst)
+	return (pivot, exact)
+
+class Tuner:
+	"""Cost model for choose_pivot's parameters, fitted by a calibration sweep.
+		For each rank bucket (the rank of the wanted element as a fraction of
+		n, on the smaller side, which the heap is built from), and each eps
+		and sample fraction, it holds the time of one level as alpha * n + beta
+		and the fraction rho of the level that survives the partition.
+	"""
+
+	def __init__(self, model):
+		# model[r] is a list of [eps, fraction, alpha, beta, rho]
+		self.model = model
+
+	def __call__(self, k, n):
+		# Parameters for one level: eps, delete_min_calls, max heap or not
+		# and sample size; a level costs about (alpha * n + beta) / (1 - rho)
+		# with the levels that follow
+		max_heap = k/n > 1/2
+		r_h = (n - k + 1)/n if max_heap else k/n
+		bucket = min(self.model, key=lambda r: abs(r - r_h))
+		eps, fraction = min(self.model[bucket],
+							key=lambda m: (m[2] * n + m[3]) / max(1 - m[4], 1e-3))[:2]
+		sample_size = min(n, max(1, math.ceil(fraction * n)))
+		# Aim the deletions so that the pivot's rank range, which eps widens
+		# upwards, is centred on the wanted rank
+		delete_min_calls = min(sample_size, max(1, round((r_h - eps/2) * sample_size)))
+		return (eps, delete_min_calls, max_heap, sample_size)
+
+	@classmethod
+	def calibrate(cls, ns=(2000, 8000), rs=(0.01, 0.1, 0.25, 0.5),
+				  epss=(0.01, 0.05, 0.1, 0.2, 1/3), fractions=(1, 1/5, 1/20), repeat=3):
+		# Time one level (pivot and partition) on random lists for every
+		# combination, and fit alpha and beta over the sizes by least squares
+		model = {}
+		for r in rs:
+			model[r] = []
+			for eps in epss:
+				for fraction in fractions:
+					tuner = cls({r: [[eps, fraction, 0, 0, 0]]})
+					times = []
+					rho = 0
+					for n in ns:
+						k = max(1, math.ceil(r * n))
+						t = 0
+						for i in range(repeat):
+							lst = np.random.permutation(n).tolist()
+							t0 = timeit.default_timer()
+							pivot = choose_pivot(k, lst, tuner)[0]
+							L, pivot_count, R = partition(pivot, lst)
+							t += timeit.default_timer() - t0
+							if k <= len(L):
+								rho += len(L)/n
+							elif k > n - len(R):
+								rho += len(R)/n
+						times.append(t/repeat)
+					alpha, beta = np.polyfit(ns, times, 1) if len(ns) > 1 else (times[0]/ns[0], 0)
+					model[r].append([eps, fraction, float(alpha), float(beta), rho/(repeat * len(ns))])
+		return cls(model)
+
+	def save(self, path):
+		with open(path, 'w') as f:
+			json.dump({str(r): m for r, m in self.model.items()}, f)
+
+	@classmethod
+	def load(cls, path):
+		with open(path) as f:
+			return cls({float(r): m for r, m in json.load(f).items()})
+
+def tuner_path():
+	# Cached models are per machine and Python version
+	name = 'tuner-{}-{}-py{}.json'.format(platform.node(), platform.machine(), platform.python_version())
+	return os.path.join(os.path.expanduser('~'), '.cache', 'soft-heaps', name)
+
+# The Tuner for method 'auto', once loaded or calibrated
+TUNER = None
+
+def auto_tuner(path=None):
+	# Load the cached model, or calibrate and cache one
+	global TUNER
+	if TUNER is None:
+		path = path or tuner_path()
+		if os.path.exists(path):
+			TUNER = Tuner.load(path)
+		else:
+			TUNER = Tuner.calibrate()
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+			TUNER.save(path)
+	return TUNER
+
+# Ranges of at most this many elements are sorted by hybrid_select: where
+# sorting a list stopped beating partitioning it in run_exp9
+SMALL_N = 16384
+
+def select(k, lst, method, viz=None, backend='simplified'):
+	# viz should be a SoftHeapVisualization object
+	if viz:
+		viz.select_record(k, lst, info="input")
+
+	n = len(lst)
+	if k > n or k < 1:
+		raise Exception('Invalid k value')
+
+	# Base Case
+	if n <= 3:
+		lst.sort()
+		return lst[k - 1]
+
+	pivot, exact = choose_pivot(k, lst, method, backend)
+	if exact and not viz:
+		return pivot
+
+	if isinstance(lst, np.ndarray):
+		L, pivot_count, R = partition_ndarray(pivot, lst)
+	else:
+		L, pivot_count, R = partition(pivot, lst)
 	if viz:
 		viz.select_record(pivot, L, R, info="partition")
 
-	if len(L) == k - 1:
+	if len(L) < k <= len(L) + pivot_count:
 		return pivot
 	elif len(L) >= k:
-		return select(k, L, method, viz=viz)
+		return select(k, L, method, viz=viz, backend=backend)
 	else:
-		return select(k - len(L) - 1, R, method, viz=viz)
+		return select(k - len(L) - pivot_count, R, method, viz=viz, backend=backend)
+
+def partition_inplace(pivot, buf, lo, hi):
+	# Three-way partition of buf[lo:hi] in place: afterwards buf[lo:lt] is below
+	# the pivot, buf[lt:gt] equals it and buf[gt:hi] is above it.
+	# NumPy arrays are partitioned with boolean masks, which copy the elements
+	# below and above the pivot before writing them back: the result is in
+	# place, but the partition takes up to hi - lo elements of temporary memory
+	if isinstance(buf, np.ndarray):
+		sub = buf[lo:hi]
+		L = sub[sub < pivot]
+		R = sub[sub > pivot]
+		lt = lo + len(L)
+		gt = hi - len(R)
+		buf[lo:lt] = L
+		buf[lt:gt] = pivot
+		buf[gt:hi] = R
+		return (lt, gt)
+	# Dijkstra's Dutch national flag partition
+	lt = i = lo
+	gt = hi
+	while i < gt:
+		elem = buf[i]
+		if elem < pivot:
+			buf[i] = buf[lt]
+			buf[lt] = elem
+			lt += 1
+			i += 1
+		elif elem > pivot:
+			gt -= 1
+			buf[i] = buf[gt]
+			buf[gt] = elem
+		else:
+			i += 1
+	return (lt, gt)
+
+def insertion_sort(buf, lo, hi):
+	# Sort the (small) range buf[lo:hi] in place
+	for j in range(lo + 1, hi):
+		elem = buf[j]
+		m = j
+		while m > lo and buf[m - 1] > elem:
+			buf[m] = buf[m - 1]
+			m -= 1
+		buf[m] = elem
+
+def select_inplace(k, buf, method, lo=0, hi=None, backend='simplified'):
+	# Select the k-th smallest element of buf[lo:hi] (a list, NumPy array or
+	# memoryview), narrowing [lo, hi) and partitioning buf in place instead of
+	# recursing on copies; buf is left reordered.  A NumPy array still needs
+	# temporary memory for each partition (see partition_inplace)
+	if hi is None:
+		hi = len(buf)
+	if k > hi - lo or k < 1:
+		raise Exception('Invalid k value')
+
+	# Index of the k-th smallest element once buf[lo:hi] is sorted
+	i = lo + k - 1
+	while True:
+		n = hi - lo
+
+		# Base Case
+		if n <= 3:
+			insertion_sort(buf, lo, hi)
+			return buf[i]
+
+		pivot, exact = choose_pivot(i - lo + 1, buf, method, backend, lo, hi)
+		if exact:
+			return pivot
+
+		lt, gt = partition_inplace(pivot, buf, lo, hi)
+		if i < lt:
+			hi = lt
+		elif i < gt:
+			return pivot
+		else:
+			lo = gt
+
+def hybrid_select(k, lst, method=4, cutoff=None, budget=6, backend='simplified', stats=None):
+	# Select the k-th smallest element of lst, introselect style: pivots are
+	# random elements until the levels have partitioned budget * n elements
+	# in all (random pivots average about 3n; more than 6n happens under 1%
+	# of the time), and come from choose_pivot after that, so that with a
+	# deterministic method (1-4) the soft heap keeps the total work linear.
+	# Ranges of at most cutoff elements are sorted.  stats, if given, counts
+	# the levels and soft heap levels
+	if cutoff is None:
+		cutoff = SMALL_N
+	n = len(lst)
+	if k > n or k < 1:
+		raise Exception('Invalid k value')
+
+	work = budget * n
+	while True:
+		if n <= cutoff:
+			if isinstance(lst, np.ndarray):
+				return np.partition(lst, k - 1)[k - 1]
+			return sorted(lst)[k - 1]
+
+		soft = work <= 0
+		if stats is not None:
+			stats['levels'] = stats.get('levels', 0) + 1
+			stats['soft'] = stats.get('soft', 0) + soft
+		if soft:
+			pivot, exact = choose_pivot(k, lst, method, backend)
+			if exact:
+				return pivot
+		else:
+			pivot = lst[np.random.randint(n)]
+			work -= n
+
+		if isinstance(lst, np.ndarray):
+			L, pivot_count, R = partition_ndarray(pivot, lst)
+		else:
+			L, pivot_count, R = partition(pivot, lst)
+		if len(L) < k <= len(L) + pivot_count:
+			return pivot
+		elif len(L) >= k:
+			lst = L
+		else:
+			k -= len(L) + pivot_count
+			lst = R
+		n = len(lst)
+
+def select_many(ks, data, method, backend='simplified'):
+	# Select the k-th smallest element of data for every k in ks, returned in
+	# the order of ks.  Works on one copy of data: each range is partitioned
+	# around a pivot chosen for the median of the ranks it still holds, and
+	# only the sides that hold requested ranks are visited
+	if len(ks) == 0:
+		return []
+	if isinstance(data, np.ndarray):
+		buf = data.copy()
+	else:
+		buf = list(data)
+	n = len(buf)
+	for k in ks:
+		if k > n or k < 1:
+			raise Exception('Invalid k value')
+
+	found = {}
+	# Ranges [lo, hi) with the sorted, distinct indices i = k - 1 they hold
+	stack = [(0, n, sorted(set(k - 1 for k in ks)))]
+	while stack:
+		lo, hi, idxs = stack.pop()
+
+		# Base Case
+		if hi - lo <= 3:
+			insertion_sort(buf, lo, hi)
+			for i in idxs:
+				found[i] = buf[i]
+			continue
+
+		i = idxs[len(idxs) // 2]
+		pivot, exact = choose_pivot(i - lo + 1, buf, method, backend, lo, hi)
+		if exact and len(idxs) == 1:
+			found[i] = pivot
+			continue
+
+		lt, gt = partition_inplace(pivot, buf, lo, hi)
+		left = [i for i in idxs if i < lt]
+		right = [i for i in idxs if i >= gt]
+		for i in idxs:
+			if lt <= i < gt:
+				found[i] = pivot
+		if left:
+			stack.append((lo, lt, left))
+		if right:
+			stack.append((gt, hi, right))
+
+	return [found[k - 1] for k in ks]
+
+class Selector:
+	"""Order-statistics index over one dataset for repeated select calls.
+		Keeps a copy of the data partitioned in place by earlier queries, and
+		the bounds of that partition: a later query only narrows the segment
+		holding its rank.  At most max_bounds bounds are kept; the least
+		recently used ones are dropped beyond that, merging their segments.
+	"""
+
+	def __init__(self, data, method=4, backend='simplified', max_bounds=4096):
+		if isinstance(data, np.ndarray):
+			self.buf = data.copy()
+		else:
+			self.buf = list(data)
+		self.method = method
+		self.backend = backend
+		self.max_bounds = max(2, max_bounds)
+		# Sorted positions splitting buf: the elements of buf[a:b] between
+		# consecutive bounds are those of ranks a + 1 to b
+		self.bounds = [0, len(self.buf)]
+		# Bounds that start a segment whose elements are all equal
+		self.equal = set()
+		# Bound -> query count when it was last used
+		self.used = {}
+		self.queries = 0
+
+	def select(self, k):
+		buf = self.buf
+		if k > len(buf) or k < 1:
+			raise Exception('Invalid k value')
+		self.queries += 1
+		i = k - 1
+		j = bisect.bisect_right(self.bounds, i)
+		lo = self.bounds[j - 1]
+		hi = self.bounds[j]
+		self.used[lo] = self.used[hi] = self.queries
+		if hi - lo == 1 or lo in self.equal:
+			return buf[lo]
+
+		while True:
+			# Base Case
+			if hi - lo <= 3:
+				insertion_sort(buf, lo, hi)
+				for b in range(lo + 1, hi):
+					self.add_bound(b)
+				break
+
+			pivot, exact = choose_pivot(i - lo + 1, buf, self.method, self.backend, lo, hi)
+			if exact:
+				self.evict()
+				return pivot
+
+			lt, gt = partition_inplace(pivot, buf, lo, hi)
+			self.add_bound(lt)
+			self.add_bound(gt)
+			if lt < gt:
+				self.equal.add(lt)
+			if i < lt:
+				hi = lt
+			elif i < gt:
+				break
+			else:
+				lo = gt
+		self.evict()
+		return buf[i]
+
+	def add_bound(self, b):
+		if b not in self.used:
+			bisect.insort(self.bounds, b)
+		self.used[b] = self.queries
+
+	def evict(self):
+		# Drop the least recently used bounds (never the ends) down to 3/4 of
+		# max_bounds; an all-equal segment stays marked only if it keeps both
+		# of its bounds
+		if len(self.bounds) <= self.max_bounds:
+			return
+		n = len(self.buf)
+		inner = sorted((b for b in self.bounds if 0 < b < n), key=self.used.get)
+		drop = set(inner[:len(self.bounds) - 3 * self.max_bounds // 4])
+		old_next = dict(zip(self.bounds, self.bounds[1:]))
+		self.bounds = [b for b in self.bounds if b not in drop]
+		new_next = dict(zip(self.bounds, self.bounds[1:]))
+		self.equal = set(b for b in self.equal if b in new_next and new_next[b] == old_next[b])
+		for b in drop:
+			del self.used[b]
+
+def key_column(data, key=None):
+	# The keys of data as a NumPy array, without copying payload columns: a
+	# field of a structured array (key is its name) or a column of a 2-D array
+	# (key is its number) is a view.  A number indexes each row of other
+	# sequences (a list of tuples, say), so that mixed records are not turned
+	# into one array first; a callable key is applied per element
+	if key is None:
+		return np.asarray(data)
+	if isinstance(key, str):
+		return data[key]
+	if isinstance(key, int):
+		if isinstance(data, np.ndarray):
+			return data[:, key]
+		return np.array([row[key] for row in data])
+	return np.array([key(elem) for elem in data])
+
+def argselect(k, data, method=4, key=None, backend='simplified'):
+	# Position in data of the k-th smallest element (by key), or an array of
+	# positions for a sequence of ranks, like np.argpartition.  Ranges are
+	# arrays of positions, partitioned by gathering only their keys; ties go
+	# to the positions in increasing order
+	col = key_column(data, key)
+	n = len(col)
+	ks = [k] if isinstance(k, (int, np.integer)) else list(k)
+	for r in ks:
+		if r > n or r < 1:
+			raise Exception('Invalid k value')
+	if not ks:
+		return np.array([], dtype=np.intp)
+
+	found = {}
+	# Positions of a range, the sorted, distinct indices i = k - 1 it holds,
+	# and how many elements rank below it
+	stack = [(np.arange(n), sorted(set(r - 1 for r in ks)), 0)]
+	while stack:
+		idx, idxs, base = stack.pop()
+		keys = col[idx]
+
+		# Base Case
+		if len(idx) <= 3:
+			order = idx[np.argsort(keys, kind='stable')]
+			for i in idxs:
+				found[i] = order[i - base]
+			continue
+
+		i = idxs[len(idxs) // 2]
+		pivot = choose_pivot(i - base + 1, keys, method, backend)[0]
+
+		below = keys < pivot
+		above = keys > pivot
+		ties = idx[keys == pivot]
+		lt = base + np.count_nonzero(below)
+		gt = lt + len(ties)
+		left = [i for i in idxs if i < lt]
+		right = [i for i in idxs if i >= gt]
+		for i in idxs:
+			if lt <= i < gt:
+				found[i] = ties[i - lt]
+		if left:
+			stack.append((idx[below], left, base))
+		if right:
+			stack.append((idx[above], right, gt))
+
+	if isinstance(k, (int, np.integer)):
+		return int(found[k - 1])
+	return np.array([found[r - 1] for r in ks])
 
 # Run experiment on select k execution time for different values of k on 1 list of size 10000 with random permutation
 # Using three tuning methods for choosing delete_min calls/corruption parameter within select k
@@ -241,6 +713,246 @@ def make_plot2(data, title, filename):
 	lgd = plt.legend(labels=labels, title='Tuning Method', loc='center left', bbox_to_anchor=(1, 0.5))
 	plt.savefig(filename, bbox_extra_artists=(lgd,), bbox_inches='tight', format='png')
 
+# Run experiment on partition and select execution time for Python lists against NumPy arrays
+# (list partition only up to max_list_n, and select only up to max_select_n, to bound run time)
+def run_exp3(lst_sizes=(10**5, 10**6, 10**7, 10**8), max_list_n=10**7, max_select_n=10**6, number=3):
+	data = {'x': list(lst_sizes), 'partition_list': [], 'partition_ndarray': [],
+			'select_list': [], 'select_ndarray': []}
+
+	for n in lst_sizes:
+		arr = np.random.permutation(n)
+		pivot = n // 2
+		print('n', n)
+
+		if n <= max_list_n:
+			lst = arr.tolist()
+			t = timeit.timeit(functools.partial(partition, pivot, lst), number=number)/number
+		else:
+			t = None
+		data['partition_list'].append(t)
+		t = timeit.timeit(functools.partial(partition_ndarray, pivot, arr), number=number)/number
+		data['partition_ndarray'].append(t)
+
+		if n <= max_select_n:
+			k = n // 2
+			t = timeit.timeit(functools.partial(select, k, arr.tolist(), 4), number=number)/number
+			data['select_list'].append(t)
+			t = timeit.timeit(functools.partial(select, k, arr, 4), number=number)/number
+			data['select_ndarray'].append(t)
+		else:
+			data['select_list'].append(None)
+			data['select_ndarray'].append(None)
+		print({key: data[key][-1] for key in data if key != 'x'})
+
+	return data
+
+# Peak bytes of traced allocations while f runs
+def peak_memory(f):
+	tracemalloc.start()
+	f()
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	return peak
+
+# Run experiment on peak memory and execution time of select against select_inplace,
+# on Python lists and NumPy arrays of size n (selecting the median by default)
+def run_exp4(lst_sizes=(10**4, 10**5, 10**6), p=1/2, method=4):
+	data = {'x': list(lst_sizes)}
+	runs = {'select': select, 'select_inplace': select_inplace}
+
+	for n in lst_sizes:
+		k = max(1, math.ceil(n * p))
+		arr = np.random.permutation(n)
+		print('n', n)
+		for name, f in runs.items():
+			for kind, make_input in (('list', arr.tolist), ('ndarray', arr.copy)):
+				# Make the input outside the traced and timed region
+				lst = make_input()
+				peak = peak_memory(functools.partial(f, k, lst, method))
+				lst = make_input()
+				t = timeit.timeit(functools.partial(f, k, lst, method), number=1)
+				data.setdefault(name + '_' + kind + '_peak', []).append(peak)
+				data.setdefault(name + '_' + kind + '_time', []).append(t)
+				print(name, kind, 'peak', peak, 'bytes', 'time', round(t, 3))
+
+	return data
+
+# Run experiment on execution time of one select_many call for a batch of percentiles
+# against one select call per percentile, on a random permutation of size n
+def run_exp5(lst_sizes=(10**4, 10**5, 10**6), ps=(0.5, 0.9, 0.99, 0.999), method=4, number=3):
+	data = {'x': list(lst_sizes), 'select': [], 'select_many': []}
+
+	for n in lst_sizes:
+		lst = np.random.permutation(n)
+		ks = [max(1, math.ceil(n * p)) for p in ps]
+		t = timeit.timeit(lambda: [select(k, lst, method) for k in ks], number=number)/number
+		data['select'].append(t)
+		t = timeit.timeit(functools.partial(select_many, ks, lst, method), number=number)/number
+		data['select_many'].append(t)
+		print('n', n, 'select x', len(ks), data['select'][-1], 'select_many', data['select_many'][-1])
+
+	return data
+
+# Run experiment on the max-heap step of select at a high rank k = n(1 - q): the
+# simplified soft heap in max-heap mode against a min heap over a negated copy
+# of the input (peak memory and time), and the time of the whole select
+def run_exp6(lst_sizes=(10**4, 10**5, 10**6), q=1/100, method=4, number=3):
+	data = {'x': list(lst_sizes)}
+
+	for n in lst_sizes:
+		lst = np.random.permutation(n).tolist()
+		k = n - math.floor(n * q)
+		# The parameters method 4 picks for the max heap
+		k_h = n - k + 1
+		eps = k_h/n
+		runs = {'max_mode': lambda: sheap_simplified.SoftHeap.from_iterable(lst, eps, order='max').delete_min_many(k_h),
+				'negated_copy': lambda: sheap_simplified.SoftHeap.from_iterable([-e for e in lst], eps).delete_min_many(k_h)}
+		print('n', n, 'k', k)
+		for name, f in runs.items():
+			peak = peak_memory(f)
+			t = timeit.timeit(f, number=number)/number
+			data.setdefault(name + '_peak', []).append(peak)
+			data.setdefault(name + '_time', []).append(t)
+			print(name, 'peak', peak, 'bytes', 'time', round(t, 3))
+		t = timeit.timeit(functools.partial(select, k, lst, method), number=number)/number
+		data.setdefault('select_time', []).append(t)
+		print('select', 'time', round(t, 3))
+
+	return data
+
+# Run experiment on execution time of select with the calibrated Tuner against
+# the fixed methods 1-6, for ranks p * n of a random permutation of size n
+def run_exp7(lst_sizes=(10**4, 10**5), ps=(0.01, 0.25, 0.5, 0.99), tuner=None, number=3):
+	tuner = tuner or auto_tuner()
+	methods = {str(m): m for m in range(1, 7)}
+	methods['tuner'] = tuner
+	data = {'x': list(lst_sizes), 'ps': list(ps)}
+
+	for n in lst_sizes:
+		lst = np.random.permutation(n).tolist()
+		for p in ps:
+			k = max(1, math.ceil(n * p))
+			times = {}
+			for name, method in methods.items():
+				times[name] = timeit.timeit(functools.partial(select, k, lst, method), number=number)/number
+				data.setdefault(name, []).append(times[name])
+			best = min((t, name) for name, t in times.items() if name != 'tuner')
+			print('n', n, 'p', p, 'tuner', round(times['tuner'], 4), 'best fixed', best[1], round(best[0], 4),
+				  'speedup over best', round(best[0]/times['tuner'], 2), 'over 4', round(times['4']/times['tuner'], 2))
+
+	return data
+
+# Run experiment on the amortised cost of rank queries: a Selector answering q
+# random rank queries on one random permutation of size n, averaged per batch
+# of queries, against calling select for each query
+def run_exp8(lst_sizes=(10**4, 10**5), queries=1000, batches=(1, 10, 100, 1000), method=4, max_bounds=4096):
+	data = {'x': list(lst_sizes), 'batches': list(batches)}
+
+	for n in lst_sizes:
+		lst = np.random.permutation(n).tolist()
+		ks = [np.random.randint(1, n + 1) for i in range(queries)]
+		sample = ks[:10]
+		t = timeit.timeit(lambda: [select(k, lst, method) for k in sample], number=1)/len(sample)
+		data.setdefault('select', []).append(t)
+		print('n', n, 'select per query', round(t, 5))
+
+		selector = Selector(lst, method, max_bounds=max_bounds)
+		done = 0
+		for b in batches:
+			t0 = timeit.default_timer()
+			for k in ks[done:b]:
+				selector.select(k)
+			t = (timeit.default_timer() - t0) / (b - done)
+			data.setdefault('selector_' + str(b), []).append(t)
+			print('n', n, 'selector queries', done + 1, 'to', b, 'per query', round(t, 6), 'bounds', len(selector.bounds))
+			done = b
+
+	return data
+
+# Run experiment on hybrid_select: the size below which sorting a list beats
+# partitioning it (the cutoff, from a ladder of sizes), then hybrid_select with
+# that cutoff against select with methods 4 and 6 on random permutations
+def run_exp9(ladder=tuple(4**i for i in range(4, 10)), lst_sizes=(10**4, 10**5, 10**6), p=1/2, number=3):
+	data = {'ladder': list(ladder), 'x': list(lst_sizes)}
+
+	cutoff = ladder[0]
+	for n in ladder:
+		lst = np.random.permutation(n).tolist()
+		k = max(1, math.ceil(n * p))
+		t_sort = timeit.timeit(lambda: sorted(lst)[k - 1], number=number)/number
+		t_part = timeit.timeit(lambda: hybrid_select(k, lst, cutoff=16), number=number)/number
+		data.setdefault('sort', []).append(t_sort)
+		data.setdefault('partition', []).append(t_part)
+		print('n', n, 'sort', round(t_sort, 5), 'partition', round(t_part, 5))
+		if t_sort <= t_part:
+			cutoff = n
+	data['cutoff'] = cutoff
+	print('cutoff', cutoff)
+
+	for n in lst_sizes:
+		lst = np.random.permutation(n).tolist()
+		k = max(1, math.ceil(n * p))
+		stats = {}
+		hybrid_select(k, lst, cutoff=cutoff, stats=stats)
+		runs = {'hybrid': functools.partial(hybrid_select, k, lst, cutoff=cutoff),
+				'select_4': functools.partial(select, k, lst, 4),
+				'select_6': functools.partial(select, k, lst, 6)}
+		row = []
+		for name, f in runs.items():
+			t = timeit.timeit(f, number=number)/number
+			data.setdefault(name, []).append(t)
+			row.append('{} {:.4f}'.format(name, t))
+		print('n', n, ', '.join(row), 'levels', stats.get('levels', 0), 'soft', stats.get('soft', 0))
+
+	return data
+
+# Run experiment on execution time of select (method 4) and hybrid_select on
+# duplicate-heavy lists: Zipf-distributed values, few distinct values and all
+# equal values; time per element stays flat when selection stays linear
+def run_exp10(lst_sizes=(10**4, 10**5, 10**6), p=1/2, method=4, max_select_n=10**6, number=3):
+	dists = {'zipf': lambda n: np.random.zipf(1.5, n).tolist(),
+			 'few_distinct': lambda n: np.random.randint(0, 8, n).tolist(),
+			 'all_equal': lambda n: [7] * n}
+	data = {'x': list(lst_sizes)}
+
+	for name, make_list in dists.items():
+		for n in lst_sizes:
+			lst = make_list(n)
+			k = max(1, math.ceil(n * p))
+			runs = {'hybrid': functools.partial(hybrid_select, k, lst)}
+			if n <= max_select_n:
+				runs['select'] = functools.partial(select, k, lst, method)
+			row = []
+			for run, f in runs.items():
+				t = timeit.timeit(f, number=number)/number
+				data.setdefault(name + '_' + run, []).append(t)
+				row.append('{} {:.4f} s ({:.2f} us/elem)'.format(run, t, t / n * 1e6))
+			print(name, 'n', n, ', '.join(row))
+
+	return data
+
+# Run experiment on finding the row of the k-th smallest key of a structured
+# array with a payload column: argselect on the key field, against select on
+# the key column followed by a scan for the row, and np.argpartition
+def run_exp11(lst_sizes=(10**4, 10**5), p=1/2, method=4, payload='S64', number=3):
+	data = {'x': list(lst_sizes)}
+
+	for n in lst_sizes:
+		rows = np.zeros(n, dtype=[('key', 'f8'), ('payload', payload)])
+		rows['key'] = np.random.random(n)
+		k = max(1, math.ceil(n * p))
+		runs = {'argselect': functools.partial(argselect, k, rows, method, 'key'),
+				'select_scan': lambda: int(np.flatnonzero(rows['key'] == select(k, rows['key'], method))[0]),
+				'argpartition': lambda: int(np.argpartition(rows['key'], k - 1)[k - 1])}
+		for name, f in runs.items():
+			peak = peak_memory(f)
+			t = timeit.timeit(f, number=number)/number
+			data.setdefault(name + '_peak', []).append(peak)
+			data.setdefault(name + '_time', []).append(t)
+			print('n', n, name, 'peak', peak, 'bytes', 'time', round(t, 4))
+
+	return data
+
 def main():
 	# Sanity check that select is working correctly
 	k = 5000
@@ -296,5 +1008,32 @@ def main():
 	# data = run_exp2(p=1)
 	# make_plot2(data, 'Average Execution Time of Select for Maximum Element', 'exp2_max_new.png')
 
+	# # Runs experiment on list against NumPy partition and select
+	# data = run_exp3()
+
+	# # Runs experiment on peak memory of select against select_inplace
+	# data = run_exp4()
+
+	# # Runs experiment on select_many against independent select calls for percentiles
+	# data = run_exp5()
+
+	# # Runs experiment on the max-heap mode against a negated copy at high ranks
+	# data = run_exp6()
+
+	# # Runs experiment on the calibrated tuner against the fixed methods
+	# data = run_exp7()
+
+	# # Runs experiment on repeated rank queries with a Selector
+	# data = run_exp8()
+
+	# # Runs experiment on the small-n cutoff and speed of hybrid_select
+	# data = run_exp9()
+
+	# # Runs experiment on select over duplicate-heavy lists
+	# data = run_exp10()
+
+	# # Runs experiment on argselect over a structured array
+	# data = run_exp11()
+
 if __name__ == '__main__':
 	main()
\ No newline at end of file
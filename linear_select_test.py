@@ -0,0 +1,177 @@
+import os
+import tempfile
+import numpy as np
+from file_select import file_select
+from linear_select import Selector, Tuner, argselect, hybrid_select, select, select_inplace, select_many
+from parallel_select import parallel_select
+
+def test_select_unsigned():
+	# A max heap over negated unsigned or bool keys must not wrap around
+	for dtype in (np.uint8, np.uint32, np.uint64, np.bool_):
+		arr = (np.random.permutation(100) % 60).astype(dtype)
+		ordered = np.sort(arr)
+		for backend in ('simplified', 'chazelle', 'arena'):
+			for k in (1, 50, 90, 100):
+				assert select(k, arr.copy(), 4, backend=backend) == ordered[k - 1]
+		# A list of NumPy scalars goes through the simplified heap's max mode
+		for k in (1, 50, 90, 100):
+			assert select(k, list(arr), 4) == ordered[k - 1]
+
+def test_select_many():
+	arr = np.random.permutation(1000)
+	ks = [1, 500, 500, 1000, 17]
+	assert select_many(ks, arr, 4) == [k - 1 for k in ks]
+	assert select_many(ks, arr.tolist(), 4) == [k - 1 for k in ks]
+	# No ranks, no work
+	assert select_many([], arr, 4) == []
+	assert select_many(np.array([], dtype=int), arr.tolist(), 4) == []
+
+def test_argselect():
+	arr = np.random.permutation(1000)
+	assert arr[argselect(300, arr)] == 299
+	ks = [1, 1000, 42]
+	assert (arr[argselect(ks, arr)] == np.array(ks) - 1).all()
+	# No ranks, no positions
+	positions = argselect([], arr)
+	assert len(positions) == 0 and positions.dtype == np.intp
+
+def test_select_duplicates():
+	# Ranks that fall among copies of the pivot return the pivot, and ranks
+	# above them skip all the copies
+	lists = (np.random.zipf(1.5, 2000).tolist(), np.random.randint(0, 8, 2000).tolist(), [7] * 2000)
+	for lst in lists:
+		ordered = sorted(lst)
+		ks = (1, 2, 1000, 1999, 2000)
+		for k in ks:
+			for method in (1, 2, 3, 4, 5, 6):
+				assert select(k, list(lst), method) == ordered[k - 1]
+			assert select(k, np.array(lst), 4) == ordered[k - 1]
+			assert hybrid_select(k, list(lst), cutoff=16) == ordered[k - 1]
+			assert select_inplace(k, list(lst), 4) == ordered[k - 1]
+		assert select_many(ks, lst, 4) == [ordered[k - 1] for k in ks]
+		assert [lst[i] for i in argselect(ks, lst)] == [ordered[k - 1] for k in ks]
+
+def test_hybrid_select_invalid_k():
+	lst = list(range(100))
+	for k in (0, -1, 101):
+		try:
+			hybrid_select(k, lst, cutoff=16)
+		except Exception as e:
+			assert str(e) == 'Invalid k value'
+		else:
+			assert False, k
+	assert hybrid_select(1, lst, cutoff=16) == 0
+
+def test_select_invalid_k():
+	arr = np.random.permutation(100)
+	calls = (lambda k: select(k, arr.tolist(), 4),
+			 lambda k: select(k, arr.copy(), 4),
+			 lambda k: select_inplace(k, arr.tolist(), 4),
+			 lambda k: select_inplace(k, arr.copy(), 4, lo=10, hi=20))
+	for f in calls:
+		for k in (0, -1, 101):
+			try:
+				f(k)
+			except Exception as e:
+				assert str(e) == 'Invalid k value'
+			else:
+				assert False, k
+	assert select_inplace(10, arr.copy(), 4, lo=10, hi=20) == max(arr[10:20])
+
+def test_argselect_records():
+	# An int key indexes each record, so numbers mixed with strings stay
+	# numbers (as one array they would compare as strings: '10' < '9')
+	keys = np.random.permutation(100)
+	records = [('item%d' % key, int(key), key % 2 == 0) for key in keys]
+	for k in (1, 10, 100):
+		assert records[argselect(k, records, key=1)][1] == k - 1
+	positions = argselect([2, 50], records, key=1)
+	assert [records[i][1] for i in positions] == [1, 49]
+	arr = np.column_stack([keys, -keys])
+	assert arr[argselect(3, arr, key=1), 1] == -97
+
+def test_tuner():
+	# A small calibration, saved and loaded back, drives select like a method
+	tuner = Tuner.calibrate(ns=(300, 600), rs=(0.1, 0.5), epss=(0.1, 1/3), fractions=(1, 1/5), repeat=1)
+	assert sorted(tuner.model) == [0.1, 0.5] and all(len(m) == 4 for m in tuner.model.values())
+	with tempfile.TemporaryDirectory() as tmp:
+		path = os.path.join(tmp, 'tuner.json')
+		tuner.save(path)
+		loaded = Tuner.load(path)
+	assert loaded.model == tuner.model
+	arr = np.random.permutation(5000)
+	for k in (1, 40, 2500, 4990, 5000):
+		assert select(k, arr.tolist(), loaded) == k - 1
+		assert select(k, arr.copy(), loaded) == k - 1
+
+def test_selector_eviction():
+	# With few bounds kept, the least recently used are dropped, and the
+	# segments left still hold exactly their ranks
+	for lst in (np.random.permutation(1000).tolist(), np.random.randint(0, 20, 1000).tolist()):
+		ordered = sorted(lst)
+		for data in (lst, np.array(lst)):
+			sel = Selector(data, max_bounds=8)
+			for k in np.random.randint(1, 1001, 100):
+				assert sel.select(k) == ordered[k - 1]
+				bounds = sel.bounds
+				assert len(bounds) <= 8 and bounds == sorted(bounds)
+				assert bounds[0] == 0 and bounds[-1] == 1000
+				assert set(sel.used) == set(bounds)
+				for a, b in zip(bounds, bounds[1:]):
+					assert sorted(sel.buf[a:b]) == ordered[a:b]
+					if a in sel.equal:
+						assert ordered[a] == ordered[b - 1]
+
+def test_parallel_select():
+	# Levels above a small cutoff go through the worker processes
+	for arr in (np.random.permutation(6000), np.random.random(6000), np.random.randint(0, 50, 6000)):
+		ordered = np.sort(arr)
+		for k in (1, 17, 3000, 6000):
+			assert parallel_select(k, arr, 4, workers=2, sample_size=200, cutoff=500, seed=k) == ordered[k - 1]
+	assert parallel_select(10, list(range(100, 0, -1)), 4) == 10
+	for k in (0, 6001):
+		try:
+			parallel_select(k, arr, 4, workers=2, cutoff=500)
+		except Exception as e:
+			assert str(e) == 'Invalid k value'
+		else:
+			assert False, k
+
+def test_file_select():
+	# Data above the memory limit is spilled level by level, read in chunks
+	with tempfile.TemporaryDirectory() as tmp:
+		path = os.path.join(tmp, 'data.bin')
+		for arr in (np.random.random(5000), np.random.randint(0, 30, 5000).astype(np.int32)):
+			ordered = np.sort(arr)
+			arr.tofile(path)
+			mapped = np.memmap(path, dtype=arr.dtype, mode='r')
+			for k in (1, 100, 2500, 5000):
+				assert file_select(k, path, arr.dtype, chunk=700, memory=500, sample_size=200,
+								   tmpdir=tmp, seed=k) == ordered[k - 1]
+				assert file_select(k, mapped, chunk=700, memory=500, sample_size=200,
+								   tmpdir=tmp, seed=k) == ordered[k - 1]
+			del mapped
+			# The spill files are removed
+			assert os.listdir(tmp) == ['data.bin']
+		for k in (0, 5001):
+			try:
+				file_select(k, path, np.int32, memory=500)
+			except Exception as e:
+				assert str(e) == 'Invalid k value'
+			else:
+				assert False, k
+
+
+if __name__ == "__main__":
+
+	test_select_unsigned()
+	test_select_many()
+	test_argselect()
+	test_select_duplicates()
+	test_hybrid_select_invalid_k()
+	test_select_invalid_k()
+	test_argselect_records()
+	test_tuner()
+	test_selector_eviction()
+	test_parallel_select()
+	test_file_select()
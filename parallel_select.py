@@ -0,0 +1,137 @@
+""" Multi-core selection over NumPy arrays in shared memory.  The data is
+	copied once into a multiprocessing.shared_memory block (with a second block
+	of the same size to partition into); at each level the parent picks a soft
+	heap pivot, the workers count their chunk's elements below and equal to the
+	pivot, and the parent turns those counts into prefix sums so that each
+	worker copies the surviving side of its chunk straight to its offset in the
+	other block.  Only chunk bounds, pivots and counts cross between processes.
+"""
+
+import functools
+import math
+import multiprocessing
+import os
+import timeit
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from linear_select import choose_pivot, select
+
+"""
+To use:
+
+	x = parallel_select(k, arr, method)	==> k-th smallest element of arr (a
+											NumPy array or list of numbers),
+											same methods and backends as
+											linear_select.select
+
+	parallel_select(k, arr, method, workers=4, sample_size=10**4, cutoff=10**5)
+										==> Pivots come from a soft heap over a
+											sample of sample_size elements (from
+											the whole level after a level that
+											shrank by less than a quarter); once
+											at most cutoff elements are left,
+											select finishes in the parent
+"""
+
+
+# Shared-memory blocks and array views of a worker, set by attach
+_shms = []
+_bufs = []
+
+def attach(names, dtype, n):
+	# Pool initializer: map the blocks into this worker
+	global _shms, _bufs
+	_shms = [SharedMemory(name=name) for name in names]
+	_bufs = [np.ndarray((n,), dtype=dtype, buffer=shm.buf) for shm in _shms]
+
+def count_chunk(src, lo, hi, pivot):
+	chunk = _bufs[src][lo:hi]
+	return (np.count_nonzero(chunk < pivot), np.count_nonzero(chunk == pivot))
+
+def copy_chunk(src, dst, lo, hi, pivot, below, offset):
+	# Copy the elements of the chunk below (or above) the pivot to dst[offset:]
+	chunk = _bufs[src][lo:hi]
+	side = chunk[chunk < pivot] if below else chunk[chunk > pivot]
+	_bufs[dst][offset:offset + len(side)] = side
+
+def parallel_select(k, data, method=4, workers=None, backend='simplified',
+					sample_size=10**4, cutoff=10**5, seed=None):
+	arr = np.asarray(data)
+	n = len(arr)
+	if k > n or k < 1:
+		raise Exception('Invalid k value')
+	if n <= cutoff:
+		return select(k, arr.copy(), method, backend=backend)
+	workers = workers or os.cpu_count()
+	rng = np.random.default_rng(seed)
+
+	shms = [SharedMemory(create=True, size=arr.nbytes) for i in range(2)]
+	bufs = [np.ndarray((n,), dtype=arr.dtype, buffer=shm.buf) for shm in shms]
+	seg = None
+	try:
+		bufs[0][:] = arr
+		with multiprocessing.Pool(workers, initializer=attach,
+								  initargs=([shm.name for shm in shms], arr.dtype, n)) as pool:
+			src = 0
+			full = False
+			while n > cutoff:
+				seg = bufs[src][:n]
+				if full:
+					pivot = choose_pivot(k, seg, method, backend)[0]
+				else:
+					sample = seg[rng.integers(0, n, sample_size)]
+					k_s = min(sample_size, max(1, math.ceil(k * sample_size / n)))
+					pivot = choose_pivot(k_s, sample, method, backend)[0]
+
+				step = math.ceil(n / workers)
+				bounds = [(lo, min(n, lo + step)) for lo in range(0, n, step)]
+				counts = pool.starmap(count_chunk, [(src, lo, hi, pivot) for lo, hi in bounds])
+				less = sum(c[0] for c in counts)
+				equal = sum(c[1] for c in counts)
+				if less < k <= less + equal:
+					return pivot
+
+				below = k <= less
+				if below:
+					sizes = [c[0] for c in counts]
+				else:
+					k -= less + equal
+					sizes = [(hi - lo) - c[0] - c[1] for (lo, hi), c in zip(bounds, counts)]
+				offsets = np.cumsum([0] + sizes[:-1]).tolist()
+				pool.starmap(copy_chunk, [(src, 1 - src, lo, hi, pivot, below, offset)
+										  for (lo, hi), offset in zip(bounds, offsets)])
+				# A sampled pivot that leaves more than 3/4 of the level is
+				# replaced by one drawn from the whole next level
+				full = sum(sizes) > 3 * n / 4
+				n = sum(sizes)
+				src = 1 - src
+
+			return select(k, bufs[src][:n].copy(), method, backend=backend)
+	finally:
+		# The views must go before the blocks can be closed
+		del seg, bufs
+		for shm in shms:
+			shm.close()
+			shm.unlink()
+
+# Run experiment on execution time of parallel_select with 1 to max_workers
+# worker processes, against select, on a random permutation of size n
+def run_scaling_exp(lst_sizes=(10**6, 10**7), p=1/2, method=4, max_workers=None, number=1):
+	max_workers = max_workers or os.cpu_count()
+	data = {'x': list(lst_sizes), 'workers': list(range(1, max_workers + 1))}
+
+	for n in lst_sizes:
+		k = max(1, math.ceil(n * p))
+		arr = np.random.permutation(n)
+		t = timeit.timeit(functools.partial(select, k, arr, method), number=number)/number
+		data.setdefault('select', []).append(t)
+		print('n', n, 'select', round(t, 3))
+		for workers in data['workers']:
+			t = timeit.timeit(functools.partial(parallel_select, k, arr, method, workers), number=number)/number
+			data.setdefault('parallel_' + str(workers), []).append(t)
+			print('n', n, 'workers', workers, round(t, 3))
+
+	return data
+
+if __name__ == '__main__':
+	run_scaling_exp()
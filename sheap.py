@@ -1,6 +1,40 @@
 # Python translation of Chazelle's paper
 
 import math 
+INF = float("inf")
+
+"""
+To use (same API as sheap_simplified.SoftHeap):
+
+    sheap = SoftHeap(eps)           ==> Make a new Soft Heap (0 <= eps < 1)
+
+    sheap.insert(7)                 ==> 7 is inserted
+
+    ptr, key = sheap.find_min()     ==> Get the first item of the queue of
+                                        minimum ckey (ptr.key) and that ckey
+
+    sheap.delete_min()              ==> Deletes an item from the minimum ckey
+
+    it, key = sheap.pop()           ==> Deletes an item from the minimum ckey
+                                        and returns its key and the ckey
+
+    (find_min, delete_min and pop raise IndexError if the heap is empty)
+
+    keys = sheap.delete_min_many(k) ==> Deletes k items (fewer if the heap
+                                        runs out) and returns their keys
+
+    sheap2 = SoftHeap(eps)
+    sheap.meld(sheap2)              ==> melds sheap2 into sheap1
+
+    sheap.insert_many(keys)         ==> Inserts every key of an iterable
+    sheap = SoftHeap.from_iterable(keys, eps)   ==> Makes a new Soft Heap
+                                                    holding keys
+
+    sheap.num_items                 ==> Number of items in the heap
+    sheap.num_corrupted             ==> Number of items whose ckey is above
+                                        their own key
+    sheap.num_roots                 ==> Number of queues in the head list
+"""
 
 class ItemListCell:
     def __init__(self):
@@ -15,6 +49,7 @@ class Node:
         self.child = None # Points to child rank-1 tree
         self.il = None # Points to beginning of item list
         self.il_tail = None # Points to end of item list
+        self.clean = 0 # Number of items in the item list whose key is ckey
 
 class Head:
     def __init__(self):
@@ -25,16 +60,47 @@ class Head:
         self.rank = None # Rank of the queue
 
 class SoftHeap:
+    # Returned by `heap` when there are no items, so callers can test
+    # `sheap.heap != SoftHeap.null` as with the other engines
+    null = None
+
     # Initialize the heap
     # head -> tail
     #         (inf)
-    def __init__(self, r):
+    def __init__(self, eps):
         self.header = Head()
         self.tail = Head()
-        self.tail.rank = float("inf")
+        self.tail.rank = INF
         self.header.next = self.tail
         self.tail.prev = self.header
-        self.r = 2 + 2 * math.ceil(math.log(1/eps))
+        self.eps = eps
+        if self.eps == 0:
+            self.r = INF
+        else:
+            self.r = 2 + 2 * math.ceil(math.log2(1/eps))
+        self.items = 0
+        self.corrupted = 0
+        self.roots = 0
+
+    @property
+    def heap(self):
+        # The first queue, or null if the heap holds no items (queues whose
+        # items were all deleted stay in the head list until the next sift)
+        if self.items == 0:
+            return SoftHeap.null
+        return self.header.next.queue
+
+    @property
+    def num_items(self):
+        return self.items
+
+    @property
+    def num_corrupted(self):
+        return self.corrupted
+
+    @property
+    def num_roots(self):
+        return self.roots
 
     # Insertion
     def insert(self, new_key):
@@ -44,10 +110,35 @@ class SoftHeap:
         l.key = new_key; l.next = None
         q.rank = 0; q.ckey = new_key
         q.il = l; q.il_tail = l
+        q.clean = 1
+        self.items += 1
         # And meld it into the head list
-        self.meld(q)
+        self.meld_queue(q)
+
+    @classmethod
+    def from_iterable(cls, keys, eps):
+        sheap = cls(eps)
+        sheap.insert_many(keys)
+        return sheap
+
+    def insert_many(self, keys):
+        if hasattr(keys, 'tolist'):
+            # NumPy arrays: compare Python scalars rather than NumPy ones
+            keys = keys.tolist()
+        for key in keys:
+            self.insert(key)
+
+    def meld(self, other):
+        # Meld every queue of other's head list into ours
+        h = other.header.next
+        while h != other.tail:
+            nxt = h.next
+            self.meld_queue(h.queue)
+            h = nxt
+        self.items += other.items
+        self.corrupted += other.corrupted
     
-    def meld(self, q):
+    def meld_queue(self, q):
         h = prev_head = to_head = self.header.next
         # Move up to_head until has rank >= q.rank
         while q.rank > to_head.rank:
@@ -75,7 +166,9 @@ class SoftHeap:
             q.rank = top.rank + 1
             q.child = bottom; q.next = top
             q.il = top.il; q.il_tail = top.il_tail
+            q.clean = top.clean
             to_head = to_head.next
+            self.roots -= 1
             # q's rank has increased by 1, but it's possible that to_head still 
             # has the same rank because it's moved forward; in that case, continue
             # the while loop
@@ -91,6 +184,7 @@ class SoftHeap:
         h.rank = q.rank
         h.prev = prev_head; h.next = to_head
         prev_head.next = h; to_head.prev = h
+        self.roots += 1
         # q is in the right place now (h), but must fix suffix_min's for h onwards
         self.fix_minlist(h)
     
@@ -107,7 +201,7 @@ class SoftHeap:
         # from the right
         while h != self.header:
             if h.queue.ckey < tmp_min.queue.ckey:
-                tmpmin = h
+                tmp_min = h
             h.suffix_min = tmp_min
             h = h.prev
     
@@ -115,9 +209,10 @@ class SoftHeap:
         # Empty out the item list
         v.il = None
         v.il_tail = None
+        v.clean = 0
         if v.next == None and v.child == None:
             # v is a leaf; stay at the bottom of the queue
-            v.ckey = float("inf")
+            v.ckey = INF
             return v
         v.next = self.sift(v.next)
         # If we violate the heap ordering, perform a rotation
@@ -129,8 +224,10 @@ class SoftHeap:
         v.il = v.next.il
         v.il_tail = v.next.il_tail
         v.ckey = v.next.ckey
-        # Possibly sift again if the rank of v is large and odd
-        if (v.rank > self.r and v.rank % 2 == 1) or (v.child.rank < v.rank-1):
+        v.clean = v.next.clean
+        # Possibly sift again if the rank of v is large, and odd or with a
+        # missing child
+        if v.rank > self.r and (v.rank % 2 == 1 or v.child.rank < v.rank-1):
             v.next = self.sift(v.next)
             # If we violate heap ordering, perform a rotation
             if v.next.ckey > v.child.ckey:
@@ -140,7 +237,13 @@ class SoftHeap:
             # Concatenate the item list of v.next to that of v unless it is
             # empty or undefined (which could happen if ckey is inf in v.child
             # and v.next)
-            if v.next.ckey != float("inf") and v.next.il != None:
+            if v.next.ckey != INF and v.next.il != None:
+                # Our items become corrupted if our ckey goes up
+                if v.next.ckey > v.ckey:
+                    self.corrupted += v.clean
+                    v.clean = v.next.clean
+                else:
+                    v.clean += v.next.clean
                 v.next.il_tail.next = v.il
                 v.il = v.next.il
                 if v.il_tail is None:
@@ -148,8 +251,8 @@ class SoftHeap:
                 v.ckey = v.next.ckey
         # Remove nodes with infinite ckeys
         # After this, it's possible that rank and number of children are different
-        if v.child.ckey == float("inf"):
-            if (v.next.ckey == float("inf")):
+        if v.child.ckey == INF:
+            if (v.next.ckey == INF):
                 v.child = None
                 v.next = None
             else:
@@ -157,7 +260,11 @@ class SoftHeap:
                 v.next = v.next.next
         return v
 
-    def delete_min(self):
+    def min_head(self):
+        # Head of the queue of minimum ckey, after making sure that queue has
+        # items; None if the heap holds no items
+        if self.items == 0:
+            return None
         h = self.header.next.suffix_min
         # If that suffix min has an item list that's empty, we need to 
         # sift up item lists into it, and then do the deletion from
@@ -177,38 +284,77 @@ class SoftHeap:
                 # Remove the min
                 h.prev.next = h.next
                 h.next.prev = h.prev
+                self.roots -= 1
                 # Fixup suffix mins
                 self.fix_minlist(h.prev)
                 # Meld in the children
                 tmp = h.queue
                 while tmp.next is not None:
-                    self.meld(tmp.child)
+                    self.meld_queue(tmp.child)
                     tmp = tmp.next
             else:
                 h.queue = self.sift(h.queue)
                 # Get rid of infinity ckeys
-                if h.queue.ckey == float('inf'):
+                if h.queue.ckey == INF:
                     h.prev.next = h.next
                     h.next.prev = h.prev
+                    self.roots -= 1
                     h = h.prev
                 self.fix_minlist(h)
-        # Now we can get the minimum key and delete one item from the 
-        # corresponding item list
-        min = h.queue.il.key
-        h.queue.il = h.queue.il.next
+            h = self.header.next.suffix_min
+        return h
+
+    def find_min(self):
+        h = self.min_head()
+        if h is None:
+            raise IndexError('find_min from empty soft heap')
+        return (h.queue.il, h.queue.ckey)
+
+    def delete_min(self):
+        h = self.min_head()
+        if h is None:
+            raise IndexError('delete_min from empty soft heap')
+        self.delete_first(h.queue)
+
+    def delete_first(self, q):
+        # Delete one item from the item list of q, the queue of minimum
+        # ckey, and return its key
+        min = q.il.key
+        if min < q.ckey:
+            self.corrupted -= 1
+        else:
+            q.clean -= 1
+        self.items -= 1
+        q.il = q.il.next
         # Fixup if we deleted the last node in the item list
-        if h.queue.il == None:
-            h.queue.il_tail = None
+        if q.il == None:
+            q.il_tail = None
         return min
 
-# Note - this doesn't work right currently - I haven't take the time
-# to debug it yet, but it's very close to the original papef so should
-# be pretty close to working
-
-eps = 1e-3
-sheap = SoftHeap(eps)
-for i in range(10):
-    sheap.insert(i)
-for i in range(5):
-    x = sheap.delete_min()
-    print(x)
\ No newline at end of file
+    def pop(self):
+        # Delete an item from the minimum ckey, and return its key and the
+        # ckey it was deleted from
+        h = self.min_head()
+        if h is None:
+            raise IndexError('pop from empty soft heap')
+        ckey = h.queue.ckey
+        return (self.delete_first(h.queue), ckey)
+
+    def delete_min_many(self, k):
+        # Delete k items (fewer if the heap runs out) and return their keys,
+        # in the order k calls to delete_min would delete them
+        keys = []
+        while k > 0 and self.items > 0:
+            keys.append(self.delete_first(self.min_head().queue))
+            k -= 1
+        return keys
+
+
+if __name__ == "__main__":
+    eps = 1e-3
+    sheap = SoftHeap(eps)
+    for i in range(10):
+        sheap.insert(i)
+    for i in range(5):
+        x, ckey = sheap.pop()
+        print(x)
\ No newline at end of file
@@ -0,0 +1,512 @@
+""" Arena-backed variant of the simplified soft heap in sheap_simplified.py.
+	Instead of one Python object per node and per item, nodes and items live
+	in struct-of-arrays pools (typed `array` columns addressed by integer
+	index), and deleted nodes/items are recycled through free lists threaded
+	through their `next` columns.  Keys are stored as C doubles, so this engine
+	is meant for numeric keys, and the keys it hands back are floats even when
+	ints went in (select with backend='arena' returns 499.0, not 499).
+"""
+
+import math
+from array import array
+INF = float('inf')
+
+# Rank of the null node; larger than any rank a real node can reach
+RANK_INF = 2 ** 31 - 1
+
+"""
+To use (same API as sheap_simplified.SoftHeap):
+
+	sheap = SoftHeap(eps)		==> Make a new Soft Heap (0 <= eps < 1)
+
+	sheap.insert(7)				==> 7 is inserted
+
+	ptr, key = sheap.find_min() ==> Get a handle to the first item of the root
+									of minimum key (ptr.key) and that root's key
+
+	sheap.delete_min()			==> Deletes an item from the minimum key
+
+	it, key = sheap.pop()		==> Deletes an item from the minimum key and
+									returns its key and the root's key
+
+	(find_min, delete_min and pop raise IndexError if the heap is empty)
+
+	keys = sheap.delete_min_many(k)	==> Deletes k items (fewer if the heap
+										runs out) and returns their keys as
+										an array('d')
+
+	sheap2 = SoftHeap(eps)
+	sheap.meld(sheap2)			==> melds sheap2 into sheap1
+
+	sheap.insert_many(keys)		==> Inserts every key of an iterable in linear
+									time; NumPy arrays and array('d') are copied
+									into the arena without per-key objects
+	sheap = SoftHeap.from_iterable(keys, eps)	==> Makes a new Soft Heap
+													holding keys
+
+	sheap.num_items				==> Number of items in the heap
+	sheap.num_corrupted			==> Number of items whose node key is above
+									their own key
+	sheap.num_roots				==> Number of trees in the root list
+
+	arena = Arena()
+	sheap = SoftHeap(eps, arena=arena)	==> Heaps sharing an arena meld without
+										copying; otherwise meld copies the other
+										heap's nodes into our arena
+"""
+
+
+class Item:
+	"""Handle to an item returned by find_min; the key is copied out of the
+		arena so it stays valid after delete_min recycles the slot.
+	"""
+
+	__slots__ = ('index', 'key')
+
+	def __init__(self, index, key):
+		self.index = index
+		self.key = key
+
+
+class Arena:
+	"""Struct-of-arrays pools for heap nodes and items.  Index 0 of each pool
+		is the null node / null item.
+	"""
+
+	def __init__(self):
+		# Node columns: key, last item of the circular item list (0 = no items),
+		# number of those items that are not corrupted, children, next root, rank
+		self.node_key = array('d', [INF])
+		self.node_set = array('i', [0])
+		self.node_clean = array('i', [0])
+		self.node_left = array('i', [0])
+		self.node_right = array('i', [0])
+		self.node_next = array('i', [0])
+		self.node_rank = array('i', [RANK_INF])
+		# Item columns: key, next item in the circular list
+		self.item_key = array('d', [INF])
+		self.item_next = array('i', [0])
+		# Heads of the free lists (0 = empty), linked through the next columns
+		self.free_node = 0
+		self.free_item = 0
+
+	def new_node(self, key, set, clean, left, right, rank):
+		i = self.free_node
+		if i:
+			self.free_node = self.node_next[i]
+			self.node_key[i] = key
+			self.node_set[i] = set
+			self.node_clean[i] = clean
+			self.node_left[i] = left
+			self.node_right[i] = right
+			self.node_next[i] = 0
+			self.node_rank[i] = rank
+		else:
+			i = len(self.node_key)
+			self.node_key.append(key)
+			self.node_set.append(set)
+			self.node_clean.append(clean)
+			self.node_left.append(left)
+			self.node_right.append(right)
+			self.node_next.append(0)
+			self.node_rank.append(rank)
+		return i
+
+	def free_node_at(self, i):
+		self.node_set[i] = 0
+		self.node_next[i] = self.free_node
+		self.free_node = i
+
+	def new_item(self, key):
+		# The new item is a circular list of its own
+		i = self.free_item
+		if i:
+			self.free_item = self.item_next[i]
+			self.item_key[i] = key
+			self.item_next[i] = i
+		else:
+			i = len(self.item_key)
+			self.item_key.append(key)
+			self.item_next.append(i)
+		return i
+
+	def free_item_at(self, i):
+		self.item_next[i] = self.free_item
+		self.free_item = i
+
+	def nbytes(self):
+		# Bytes held by the columns, not counting over-allocation
+		cols = (self.node_key, self.node_set, self.node_clean, self.node_left,
+				self.node_right, self.node_next, self.node_rank, self.item_key,
+				self.item_next)
+		return sum(len(c) * c.itemsize for c in cols)
+
+
+class SoftHeap:
+	"""Soft heap whose nodes are indices into an Arena.  Mirrors
+		sheap_simplified.SoftHeapNode, with the recursive helpers written as
+		loops.
+	"""
+
+	# Null node index, so callers can test `sheap.heap != SoftHeap.null`
+	null = 0
+
+	def __init__(self, eps, arena=None):
+		self.eps = eps
+		if self.eps == 0:
+			self.T = INF
+		else:
+			self.T = math.ceil(math.log2(3 / self.eps))
+		self.arena = arena if arena is not None else Arena()
+		self.heap = SoftHeap.null
+		# Counts of our items, corrupted items (key below their node's key)
+		# and roots
+		self.items = 0
+		self.corrupted = 0
+		self.roots = 0
+
+	@property
+	def num_items(self):
+		return self.items
+
+	@property
+	def num_corrupted(self):
+		return self.corrupted
+
+	@property
+	def num_roots(self):
+		return self.roots
+
+	def rank_swap(self, x):
+		# Swap x with the next heap node if next has a smaller rank
+		a = self.arena
+		y = a.node_next[x]
+		if a.node_rank[x] <= a.node_rank[y]:
+			return x
+		a.node_next[x] = a.node_next[y]
+		a.node_next[y] = x
+		return y
+
+	def key_swap(self, x):
+		# Swap x with the next heap node if next has a smaller key
+		a = self.arena
+		y = a.node_next[x]
+		if a.node_key[x] <= a.node_key[y]:
+			return x
+		a.node_next[x] = a.node_next[y]
+		a.node_next[y] = x
+		return y
+
+	def fill_step(self, x):
+		# The non-recursive part of fill: merge x's smaller child into x.
+		# Returns True if that child still has children and must be defilled
+		a = self.arena
+		left = a.node_left
+		l = left[x]
+		r = a.node_right[x]
+		if a.node_key[l] > a.node_key[r]:
+			l, r = r, l
+			left[x] = l
+			a.node_right[x] = r
+		# l's items keep their key, so only x's own clean items can become
+		# corrupted, when x's key goes up
+		node_key = a.node_key
+		node_set = a.node_set
+		clean = a.node_clean
+		if node_set[x] == 0:
+			clean[x] = clean[l]
+			node_set[x] = node_set[l]
+		else:
+			if node_key[l] > node_key[x]:
+				self.corrupted += clean[x]
+				clean[x] = clean[l]
+			else:
+				clean[x] += clean[l]
+			s, t = node_set[x], node_set[l]
+			item_next = a.item_next
+			item_next[s], item_next[t] = item_next[t], item_next[s]
+		node_key[x] = node_key[l]
+		node_set[l] = 0
+		if left[l] == 0:
+			# l is a leaf and now empty: recycle it, move right child left
+			left[x] = r
+			a.node_right[x] = 0
+			a.free_node_at(l)
+			return False
+		return True
+
+	def defill(self, x):
+		# defill(x) = fill(x), then fill(x) again if x has even rank above T
+		# and is not a leaf; fill(x) ends by defilling x's left child.
+		# `stack` holds the nodes whose fill is waiting on a child's defill,
+		# with whether that fill was their second one
+		a = self.arena
+		rank = a.node_rank
+		left = a.node_left
+		T = self.T
+		stack = []
+		second = False
+		while True:
+			if self.fill_step(x):
+				stack.append((x, second))
+				x, second = left[x], False
+				continue
+			# fill(x) is complete; finish every defill that completes with it
+			while True:
+				if not second and rank[x] > T and rank[x] % 2 == 0 and left[x] != 0:
+					second = True
+					break
+				if not stack:
+					return
+				x, second = stack.pop()
+
+	def link(self, x, y):
+		# Make a new node with 1 bigger rank than x and y, with x and y
+		# as children, and merge up small children
+		a = self.arena
+		z = a.new_node(INF, 0, 0, x, y, a.node_rank[x] + 1)
+		self.roots -= 1
+		self.defill(z)
+		return z
+
+	def meldable_insert(self, h, x):
+		# Assuming x and h are in meldable order: while x has h's rank, link
+		# them and carry into the rest of the list
+		a = self.arena
+		rank = a.node_rank
+		while rank[x] >= rank[h]:
+			nxt = self.rank_swap(a.node_next[h])
+			x = self.link(x, h)
+			h = nxt
+		a.node_next[x] = self.key_swap(h)
+		return x
+
+	def meldable_meld(self, h, g):
+		# Assuming h and g are meldable: peel off the lower-rank first root
+		# until one list runs out, then meldable_insert the peeled roots back
+		# in reverse order
+		a = self.arena
+		rank = a.node_rank
+		stack = []
+		while True:
+			if rank[h] > rank[g]:
+				h, g = g, h
+			if g == SoftHeap.null:
+				break
+			stack.append(h)
+			h, g = g, self.rank_swap(a.node_next[h])
+		while stack:
+			h = self.meldable_insert(h, stack.pop())
+		return h
+
+	def reorder(self, h, k):
+		# Walking forward while the next root has rank < k, swap by rank;
+		# walking back, swap by key --> findable order
+		a = self.arena
+		rank = a.node_rank
+		node_next = a.node_next
+		stack = []
+		while rank[node_next[h]] < k:
+			h = self.rank_swap(h)
+			stack.append(h)
+			h = node_next[h]
+		h = self.key_swap(h)
+		while stack:
+			p = stack.pop()
+			node_next[p] = h
+			h = self.key_swap(p)
+		return h
+
+	def insert(self, it):
+		a = self.arena
+		e = a.new_item(it)
+		x = a.new_node(it, e, 1, 0, 0, 0)
+		self.items += 1
+		self.roots += 1
+		self.heap = self.key_swap(self.meldable_insert(self.rank_swap(self.heap), x))
+
+	@classmethod
+	def from_iterable(cls, keys, eps, arena=None):
+		sheap = cls(eps, arena=arena)
+		sheap.insert_many(keys)
+		return sheap
+
+	def insert_many(self, keys):
+		# Append the keys to the item and node columns in bulk, link the new
+		# roots into trees like a binary counter (slots[k] holds the pending
+		# tree of rank k), lay the trees out once as a root list in findable
+		# order, and meld that in
+		a = self.arena
+		i0 = len(a.item_key)
+		if hasattr(keys, 'astype'):
+			# NumPy arrays: copy the buffer straight into the key column
+			a.item_key.frombytes(memoryview(keys.astype('d', order='C', copy=False)).cast('B'))
+		else:
+			a.item_key.extend(keys)
+		n = len(a.item_key) - i0
+		a.item_next.extend(range(i0, i0 + n))
+		j0 = len(a.node_key)
+		a.node_key.extend(a.item_key[i0:])
+		a.node_set.extend(range(i0, i0 + n))
+		a.node_clean.extend(array('i', [1]) * n)
+		self.items += n
+		self.roots += n
+		zeros = bytes(n * a.node_left.itemsize)
+		a.node_left.frombytes(zeros)
+		a.node_right.frombytes(zeros)
+		a.node_next.frombytes(zeros)
+		a.node_rank.frombytes(zeros)
+		slots = []
+		for x in range(j0, j0 + n):
+			k = 0
+			while k < len(slots) and slots[k]:
+				x = self.link(slots[k], x)
+				slots[k] = 0
+				k += 1
+			if k == len(slots):
+				slots.append(x)
+			else:
+				slots[k] = x
+		h = SoftHeap.null
+		for x in reversed(slots):
+			if x:
+				a.node_next[x] = h
+				h = self.key_swap(x)
+		self.heap = self.key_swap(self.meldable_meld(self.rank_swap(self.heap), self.rank_swap(h)))
+
+	def find_min(self):
+		a = self.arena
+		h = self.heap
+		if h == SoftHeap.null:
+			raise IndexError('find_min from empty soft heap')
+		i = a.item_next[a.node_set[h]]
+		return (Item(i, a.item_key[i]), a.node_key[h])
+
+	def delete_min(self):
+		a = self.arena
+		h = self.heap
+		if h == SoftHeap.null:
+			raise IndexError('delete_min from empty soft heap')
+		s = a.node_set[h]
+		first = a.item_next[s]
+		self.items -= 1
+		if a.item_key[first] < a.node_key[h]:
+			self.corrupted -= 1
+		else:
+			a.node_clean[h] -= 1
+		# More than one item: wire out the first one
+		if first != s:
+			a.item_next[s] = a.item_next[first]
+			a.free_item_at(first)
+			return
+		# Only one item: delete it, then remove or refill the root
+		a.free_item_at(s)
+		a.node_set[h] = 0
+		k = a.node_rank[h]
+		if a.node_left[h] == 0:
+			self.roots -= 1
+			nxt = a.node_next[h]
+			a.free_node_at(h)
+			h = nxt
+		else:
+			self.defill(h)
+		self.heap = self.reorder(h, k)
+
+	def pop(self):
+		# Delete an item from the minimum key, and return its key and the
+		# key of the root it was deleted from
+		a = self.arena
+		h = self.heap
+		if h == SoftHeap.null:
+			raise IndexError('pop from empty soft heap')
+		key = (a.item_key[a.item_next[a.node_set[h]]], a.node_key[h])
+		self.delete_min()
+		return key
+
+	def delete_min_many(self, k):
+		# Delete k items (fewer if the heap runs out) and return their keys,
+		# in the order k calls to delete_min would delete them.  Items are
+		# taken straight off the minimum root's item list; the root is only
+		# refilled and the findable order restored when that list empties
+		a = self.arena
+		item_key = a.item_key
+		item_next = a.item_next
+		keys = array('d')
+		while k > 0 and self.heap != SoftHeap.null:
+			h = self.heap
+			last = a.node_set[h]
+			it = item_next[last]
+			while k > 1 and it != last:
+				keys.append(item_key[it])
+				if item_key[it] < a.node_key[h]:
+					self.corrupted -= 1
+				else:
+					a.node_clean[h] -= 1
+				self.items -= 1
+				nxt = item_next[it]
+				a.free_item_at(it)
+				it = nxt
+				k -= 1
+			item_next[last] = it
+			keys.append(item_key[it])
+			self.delete_min()
+			k -= 1
+		return keys
+
+	def meld(self, other):
+		if other.arena is self.arena:
+			g = other.heap
+		else:
+			g = self.copy_roots(other.arena, other.heap)
+		self.items += other.items
+		self.corrupted += other.corrupted
+		self.roots += other.roots
+		self.heap = self.key_swap(self.meldable_meld(self.rank_swap(self.heap), self.rank_swap(g)))
+
+	def copy_roots(self, src, h):
+		# Copy the root list starting at h in arena src into our arena;
+		# returns the index of the copied first root
+		a = self.arena
+		first = prev = SoftHeap.null
+		while h != SoftHeap.null:
+			x = self.copy_tree(src, h)
+			if prev == SoftHeap.null:
+				first = x
+			else:
+				a.node_next[prev] = x
+			prev = x
+			h = src.node_next[h]
+		return first
+
+	def copy_tree(self, src, root):
+		# Iterative copy of the tree at root, including its item lists
+		a = self.arena
+		new_root = None
+		stack = [(root, 0, False)]
+		while stack:
+			x, parent, is_left = stack.pop()
+			s = src.node_set[x]
+			set = 0
+			if s:
+				# Copy the circular item list, keeping its order
+				i = src.item_next[s]
+				first = last = a.new_item(src.item_key[i])
+				while i != s:
+					i = src.item_next[i]
+					e = a.new_item(src.item_key[i])
+					a.item_next[last] = e
+					last = e
+				a.item_next[last] = first
+				set = last
+			y = a.new_node(src.node_key[x], set, src.node_clean[x], 0, 0, src.node_rank[x])
+			if new_root is None:
+				new_root = y
+			elif is_left:
+				a.node_left[parent] = y
+			else:
+				a.node_right[parent] = y
+			if src.node_right[x]:
+				stack.append((src.node_right[x], y, False))
+			if src.node_left[x]:
+				stack.append((src.node_left[x], y, True))
+		return new_root
@@ -0,0 +1,520 @@
+import sheap
+import sheap_simplified
+import sheap_arena
+import sheap_stream
+import sheap_sort
+import sheap_simplified_test
+import argparse
+import bisect
+import gc
+import json
+import math
+import operator
+import os
+import numpy as np
+import pickle
+import platform
+import random
+import statistics
+import sys
+import timeit
+import tracemalloc
+
+# Bytes of traced allocations per key held by a heap built from keys
+def bytes_per_key(make_heap, keys):
+	tracemalloc.start()
+	before = tracemalloc.get_traced_memory()[0]
+	sheap = make_heap()
+	for key in keys:
+		sheap.insert(key)
+	after = tracemalloc.get_traced_memory()[0]
+	tracemalloc.stop()
+	return (after - before) / max(1, len(keys))
+
+# Run experiment on memory use per stored key of the object graph heap
+# (sheap_simplified) against the arena heap (sheap_arena), for float keys
+def run_mem_exp(ns=(10**3, 10**4, 10**5, 10**6), eps=0.1):
+	data = {'x': list(ns), 'object': [], 'arena': []}
+	for n in ns:
+		keys = [random.random() for i in range(n)]
+		data['object'].append(bytes_per_key(lambda: sheap_simplified.SoftHeap(eps), keys))
+		data['arena'].append(bytes_per_key(lambda: sheap_arena.SoftHeap(eps), keys))
+		print('n', n, 'object', round(data['object'][-1], 1),
+			  'arena', round(data['arena'][-1], 1), 'bytes/key')
+	return data
+
+# Insert n keys into two heaps, meld them and drain the result
+def build_meld_drain(make_heap, keys):
+	half = len(keys) // 2
+	P = make_heap()
+	Q = make_heap()
+	for key in keys[:half]:
+		P.insert(key)
+	for key in keys[half:]:
+		Q.insert(key)
+	P.meld(Q)
+	while P.heap != P.null:
+		P.delete_min()
+
+# Run build_meld_drain under a recursion limit only `depth` frames above
+# the caller; returns whether it completed
+def runs_with_recursion_limit(make_heap, keys, depth=100):
+	frames = 0
+	f = sys._getframe()
+	while f is not None:
+		frames += 1
+		f = f.f_back
+	limit = sys.getrecursionlimit()
+	sys.setrecursionlimit(frames + depth)
+	try:
+		build_meld_drain(make_heap, keys)
+		return True
+	except RecursionError:
+		return False
+	finally:
+		sys.setrecursionlimit(limit)
+
+# Run experiment on build/meld/drain time for both engines under a recursion
+# limit only `depth` frames above the caller (a tenth of the default).  Their
+# recursive paths (defill, reorder, meldable_insert, meldable_meld and sift)
+# go O(log n) deep, so no sys.setrecursionlimit tuning is needed
+def run_recursion_exp(ns=(10**5, 10**6, 10**7), eps=0.1, depth=100):
+	data = {'x': list(ns)}
+	engines = {'simplified': sheap_simplified.SoftHeap, 'chazelle': sheap.SoftHeap}
+	for n in ns:
+		keys = [random.random() for i in range(n)]
+		row = []
+		for name, SoftHeap in engines.items():
+			t = timeit.default_timer()
+			ok = runs_with_recursion_limit(lambda: SoftHeap(eps), keys, depth)
+			data.setdefault(name, []).append(timeit.default_timer() - t)
+			data.setdefault(name + '_low_limit', []).append(ok)
+			row.append('{} {:.3f} seconds, runs under the limit: {}'.format(name, data[name][-1], ok))
+		print('n', n, ', '.join(row))
+	return data
+
+# Run experiment on heap construction time: n calls to insert against one
+# call to from_iterable, for both engines, from a list and a NumPy array
+def run_build_exp(ns=(10**4, 10**5, 10**6), eps=0.1, number=3):
+	data = {'x': list(ns)}
+	engines = {'object': sheap_simplified.SoftHeap, 'arena': sheap_arena.SoftHeap}
+	def insert_loop(SoftHeap, keys):
+		sheap = SoftHeap(eps)
+		for key in keys:
+			sheap.insert(key)
+	for n in ns:
+		keys = [random.random() for i in range(n)]
+		arr = np.array(keys)
+		row = []
+		for name, SoftHeap in engines.items():
+			runs = {'insert': lambda: insert_loop(SoftHeap, keys),
+					'from_list': lambda: SoftHeap.from_iterable(keys, eps),
+					'from_ndarray': lambda: SoftHeap.from_iterable(arr, eps)}
+			for run, f in runs.items():
+				t = timeit.timeit(f, number=number)/number
+				data.setdefault(name + '_' + run, []).append(t)
+				row.append('{} {} {:.3f}'.format(name, run, t))
+		print('n', n, ', '.join(row))
+	return data
+
+# Run experiment on draining a heap: find_min/delete_min pairs against pop
+# and against delete_min_many in batches of `batch`, for both engines
+def run_pop_exp(ns=(10**4, 10**5, 10**6), eps=0.1, batch=1000, number=3):
+	data = {'x': list(ns)}
+	engines = {'object': sheap_simplified.SoftHeap, 'arena': sheap_arena.SoftHeap}
+	def find_delete(sheap):
+		while sheap.heap != sheap.null:
+			ptr, key = sheap.find_min()
+			ptr.key
+			sheap.delete_min()
+	def pop(sheap):
+		while sheap.heap != sheap.null:
+			sheap.pop()
+	def delete_many(sheap):
+		while sheap.heap != sheap.null:
+			sheap.delete_min_many(batch)
+	for n in ns:
+		keys = [random.random() for i in range(n)]
+		row = []
+		for name, SoftHeap in engines.items():
+			for run, drain in (('find_delete', find_delete), ('pop', pop), ('delete_min_many', delete_many)):
+				t = 0
+				for i in range(number):
+					sheap = SoftHeap.from_iterable(keys, eps)
+					t += timeit.timeit(lambda: drain(sheap), number=1)/number
+				data.setdefault(name + '_' + run, []).append(t)
+				row.append('{} {} {:.3f}'.format(name, run, t))
+		print('n', n, ', '.join(row))
+	return data
+
+# Run experiment on the corruption a heap reports (num_corrupted) against
+# the eps*n bound, after building from n keys and after deleting half of them
+def run_corruption_exp(n=10**5, epss=(0.01, 0.1, 1/3, 0.5), seed=0):
+	random.seed(seed)
+	keys = [random.random() for i in range(n)]
+	data = {'x': list(epss), 'bound': [], 'built': [], 'half_deleted': []}
+	for eps in epss:
+		sheap = sheap_simplified.SoftHeap.from_iterable(keys, eps)
+		data['built'].append(sheap.num_corrupted)
+		sheap.delete_min_many(n // 2)
+		data['half_deleted'].append(sheap.num_corrupted)
+		data['bound'].append(math.floor(eps * n))
+		print('eps', round(eps, 3), 'bound', data['bound'][-1],
+			  'corrupted after build', data['built'][-1],
+			  'after deleting half', data['half_deleted'][-1])
+	return data
+
+# Run experiment on a QuantileStream fed n random keys: time per key, values
+# held, and the largest rank error of rank() on sampled keys against its bound
+def run_stream_exp(ns=(10**4, 10**5, 10**6), epss=(0.1, 0.01, 0.001), samples=200):
+	data = {'x': list(ns)}
+	for n in ns:
+		keys = [random.random() for i in range(n)]
+		ordered = sorted(keys)
+		row = []
+		for eps in epss:
+			qs = sheap_stream.QuantileStream(eps)
+			t = timeit.timeit(lambda: qs.extend(keys), number=1)
+			held = sum(len(level) for level in qs.levels)
+			worst = max(abs(qs.rank(x) - bisect.bisect_right(ordered, x))
+						for x in random.sample(keys, samples))
+			for name, value in (('us_per_key', 10**6 * t / n), ('held', held),
+								('error', worst / n), ('bound', qs.error / n)):
+				data.setdefault('{}_{}'.format(eps, name), []).append(value)
+			row.append('eps {} {:.2f} us/key, {} held, error {:.4f}n (bound {:.4f}n)'.format(
+				eps, 10**6 * t / n, held, worst / n, qs.error / n))
+		print('n', n, '; '.join(row))
+	return data
+
+# Run experiment on throughput (operations per second) of the soft heap
+# engines head to head: building from n keys, find_min on the built heap,
+# and draining it with delete_min_many
+def run_engine_exp(ns=(10**4, 10**5, 10**6), eps=0.1, finds=10**5):
+	data = {'x': list(ns)}
+	engines = {'simplified': sheap_simplified.SoftHeap, 'chazelle': sheap.SoftHeap,
+			   'arena': sheap_arena.SoftHeap}
+	for n in ns:
+		keys = [random.random() for i in range(n)]
+		row = []
+		for name, SoftHeap in engines.items():
+			t = timeit.default_timer()
+			P = SoftHeap.from_iterable(keys, eps)
+			build = n / (timeit.default_timer() - t)
+			find = finds / timeit.timeit(P.find_min, number=finds)
+			t = timeit.default_timer()
+			P.delete_min_many(n)
+			drain = n / (timeit.default_timer() - t)
+			for run, ops in (('build', build), ('find_min', find), ('drain', drain)):
+				data.setdefault(name + '_' + run, []).append(ops)
+			row.append('{} build {:.0f} find_min {:.0f} drain {:.0f}'.format(name, build, find, drain))
+		print('n', n, 'ops/s:', ', '.join(row))
+	return data
+
+# Run experiment on the cost of instrumentation: build/meld/drain time of the
+# plain heap against CountingSoftHeap, untimed and timed
+def run_counting_exp(ns=(10**4, 10**5), eps=0.1, number=3):
+	data = {'x': list(ns)}
+	heaps = {'plain': lambda: sheap_simplified.SoftHeap(eps),
+			 'counting': lambda: sheap_simplified.CountingSoftHeap(eps),
+			 'counting_timed': lambda: sheap_simplified.CountingSoftHeap(eps, timed=True)}
+	for n in ns:
+		keys = [random.random() for i in range(n)]
+		row = []
+		for name, make_heap in heaps.items():
+			t = timeit.timeit(lambda: build_meld_drain(make_heap, keys), number=number)/number
+			data.setdefault(name, []).append(t)
+			row.append('{} {:.3f}'.format(name, t))
+		print('n', n, ', '.join(row), 'seconds')
+	return data
+
+# Insert n keys, cancel a fraction of them, then drain the live ones.  Lazy
+# delete through item handles against skipping cancelled keys on the way out
+def cancel_delete(eps, keys, cancel):
+	P = sheap_simplified.SoftHeap(eps)
+	handles = [P.insert(k) for k in keys]
+	for i in cancel:
+		P.delete(handles[i])
+	out = []
+	while P.num_items > 0:
+		out.append(P.pop()[0])
+	return out
+
+def cancel_skip_set(eps, keys, cancel):
+	P = sheap_simplified.SoftHeap.from_iterable(keys, eps)
+	cancelled = set(keys[i] for i in cancel)
+	out = []
+	while P.num_items > 0:
+		k = P.pop()[0]
+		if k not in cancelled:
+			out.append(k)
+	return out
+
+def run_cancel_exp(ns=(10**4, 10**5), eps=0.1, fractions=(0.5, 0.9), number=3):
+	data = {'x': list(ns)}
+	ways = {'delete': cancel_delete, 'skip_set': cancel_skip_set}
+	for fraction in fractions:
+		for n in ns:
+			keys = [random.random() for i in range(n)]
+			cancel = random.sample(range(n), int(fraction * n))
+			row = []
+			for name, f in ways.items():
+				t = timeit.timeit(lambda: f(eps, keys, cancel), number=number)/number
+				data.setdefault('{} {}'.format(name, fraction), []).append(t)
+				row.append('{} {:.3f}'.format(name, t))
+			print('cancel', fraction, 'n', n, ', '.join(row), 'seconds')
+	return data
+
+# approx_sort (as a generator and as an array) against sorted() and np.sort,
+# with the measured inversions of its output
+def run_approx_sort_exp(n=10**5, epss=(0, 0.01, 0.1, 0.3, 0.5), number=3):
+	keys = [random.random() for i in range(n)]
+	arr = np.array(keys)
+	t_sorted = timeit.timeit(lambda: sorted(keys), number=number)/number
+	t_np = timeit.timeit(lambda: np.sort(arr), number=number)/number
+	print('n', n, 'sorted {:.4f} np.sort {:.4f} seconds'.format(t_sorted, t_np))
+	data = {'x': list(epss), 'sorted': t_sorted, 'np.sort': t_np}
+	for eps in epss:
+		t_gen = timeit.timeit(lambda: list(sheap_sort.approx_sort(keys, eps)), number=number)/number
+		t_arr = timeit.timeit(lambda: sheap_sort.approx_sort(arr, eps, array=True), number=number)/number
+		total, worst = sheap_sort.inversions(sheap_sort.approx_sort(arr, eps, array=True))
+		data.setdefault('generator', []).append(t_gen)
+		data.setdefault('array', []).append(t_arr)
+		data.setdefault('inversions', []).append(total)
+		data.setdefault('worst', []).append(worst)
+		print('eps', eps, 'generator {:.4f} array {:.4f} seconds,'.format(t_gen, t_arr),
+			  'inversions', total, 'worst', worst, 'bound', eps * n)
+	return data
+
+# Records of (key, id, payload) drained in key order, as key/value items and
+# through a key function, against bare keys with no payload.  (Pushing the
+# records themselves fails: null's key is INF, which a tuple cannot compare
+# against)
+def run_payload_exp(ns=(10**4, 10**5), eps=0.1, number=3):
+	data = {'x': list(ns)}
+	SoftHeap = sheap_simplified.SoftHeap
+	def bare_keys(recs):
+		return SoftHeap.from_iterable([r[0] for r in recs], eps)
+	def key_value(recs):
+		P = SoftHeap(eps)
+		P.insert_many([r[0] for r in recs], recs)
+		return P
+	def key_fn(recs):
+		return SoftHeap.from_iterable(recs, eps, key=operator.itemgetter(0))
+	for n in ns:
+		recs = [(random.random(), i, {'id': i}) for i in range(n)]
+		row = []
+		for name, build in (('bare_keys', bare_keys), ('key_value', key_value), ('key_fn', key_fn)):
+			t = timeit.timeit(lambda: build(recs).delete_min_many(n), number=number)/number
+			data.setdefault(name, []).append(t)
+			row.append('{} {:.3f}'.format(name, t))
+		print('n', n, ', '.join(row), 'seconds')
+	return data
+
+# Snapshot of a heap of n keys: dump, load, and load with mmap (opening only,
+# and through the first find_min), against pickling the object graph
+def run_snapshot_exp(ns=(10**4, 10**5, 10**6), eps=0.1, path='sheap_snapshot.bin', number=3):
+	SoftHeap = sheap_simplified.SoftHeap
+	data = {'x': list(ns)}
+	for n in ns:
+		P = SoftHeap.from_iterable([random.random() for i in range(n)], eps)
+		runs = {'dump': lambda: P.dump(path),
+				'load': lambda: SoftHeap.load(path),
+				'load_mmap': lambda: SoftHeap.load(path, mmap=True),
+				'load_mmap_find_min': lambda: SoftHeap.load(path, mmap=True).find_min()}
+		row = []
+		for name, f in runs.items():
+			t = timeit.timeit(f, number=number)/number
+			data.setdefault(name, []).append(t)
+			row.append('{} {:.4f}'.format(name, t))
+		# Item lists and trees make pickle recurse deeply
+		limit = sys.getrecursionlimit()
+		sys.setrecursionlimit(max(limit, 10 * n))
+		try:
+			pickled = pickle.dumps(P)
+			t_dump = timeit.timeit(lambda: pickle.dumps(P), number=number)/number
+			t_load = timeit.timeit(lambda: pickle.loads(pickled), number=number)/number
+			row.append('pickle_dump {:.4f} pickle_load {:.4f}'.format(t_dump, t_load))
+		except RecursionError:
+			pickled = b''
+			t_dump = t_load = None
+			row.append('pickle failed')
+		finally:
+			sys.setrecursionlimit(limit)
+		data.setdefault('pickle_dump', []).append(t_dump)
+		data.setdefault('pickle_load', []).append(t_load)
+		print('n', n, ', '.join(row), 'seconds;', os.path.getsize(path), 'bytes against', len(pickled))
+	os.remove(path)
+	return data
+
+# Keys of each distribution in the benchmark suite
+def suite_keys(dist, n, rng):
+	if dist == 'uniform':
+		return [rng.random() for i in range(n)]
+	elif dist == 'sorted':
+		return sorted(rng.random() for i in range(n))
+	elif dist == 'reversed':
+		return sorted((rng.random() for i in range(n)), reverse=True)
+	elif dist == 'few_unique':
+		return [float(rng.randrange(10)) for i in range(n)]
+	raise Exception('Unknown key distribution ' + dist)
+
+# Time of one run of f(state), where a fresh state is made by setup()
+# outside the timed region; returns seconds.  Like timeit, the garbage
+# collector is off while timing
+def time_once(setup, f):
+	state = setup()
+	gc.disable()
+	try:
+		t = timeit.default_timer()
+		f(state)
+		return timeit.default_timer() - t
+	finally:
+		gc.enable()
+
+# The primitives of the suite for one heap class, key list and eps, as
+# (primitive, setup, f, per) where per is what one run is divided by
+def suite_runs(SoftHeap, keys, eps, finds):
+	n = len(keys)
+	half = n // 2
+	def empty():
+		return SoftHeap(eps)
+	def built():
+		return SoftHeap.from_iterable(keys, eps)
+	def halves():
+		return (SoftHeap.from_iterable(keys[:half], eps),
+				SoftHeap.from_iterable(keys[half:], eps))
+	def insert(P):
+		for key in keys:
+			P.insert(key)
+	def find_min(P):
+		for i in range(finds):
+			P.find_min()
+	def delete_min(P):
+		while P.heap != P.null:
+			P.delete_min()
+	def meld(PQ):
+		PQ[0].meld(PQ[1])
+	def drain(P):
+		P.delete_min_many(n)
+	def heapsort(_):
+		sheap_simplified_test.sort(keys, eps, heap_class=SoftHeap, verbose=False)
+	return (('insert', empty, insert, n), ('find_min', built, find_min, finds),
+			('delete_min', built, delete_min, n), ('meld', halves, meld, 1),
+			('drain', built, drain, n), ('heapsort', lambda: None, heapsort, n))
+
+# Run the benchmark suite of the soft heap primitives (insert, find_min,
+# delete_min, meld, bulk drain and heapsort through sheap_simplified_test.sort)
+# for every engine, key distribution, n and eps; returns the median of
+# `repeat` runs in nanoseconds per key (per call for find_min and meld),
+# keyed by 'engine/dist/n/eps/primitive'
+def run_suite(ns=(10**3, 10**4), epss=(0.01, 0.1, 0.5),
+			  dists=('uniform', 'sorted', 'reversed', 'few_unique'),
+			  engines=('simplified', 'arena', 'chazelle'),
+			  finds=10**4, repeat=5, seed=0, only=None, noise=None):
+	# only: if given, the set of 'engine/dist/n/eps/' prefixes to run.
+	# noise: if given, filled with the relative noise of each benchmark, the
+	# median absolute deviation of its runs over their median
+	classes = {'simplified': sheap_simplified.SoftHeap, 'arena': sheap_arena.SoftHeap,
+			   'chazelle': sheap.SoftHeap}
+	jobs = []
+	for name in engines:
+		for dist in dists:
+			for n in ns:
+				keys = suite_keys(dist, n, random.Random(seed))
+				for eps in epss:
+					prefix = '{}/{}/{}/{}/'.format(name, dist, n, eps)
+					if only is not None and prefix not in only:
+						continue
+					for primitive, setup, f, per in suite_runs(classes[name], keys, eps, finds):
+						jobs.append((prefix + primitive, setup, f, per))
+
+	# Run the whole grid `repeat` times rather than each benchmark `repeat`
+	# times in a row, so that the runs of a benchmark are spread over the
+	# suite and its noise includes the machine's drift over that time
+	times = {name: [] for name, setup, f, per in jobs}
+	for r in range(repeat):
+		for name, setup, f, per in jobs:
+			times[name].append(time_once(setup, f) / per)
+		print('round', r + 1, 'of', repeat, 'done')
+
+	results = {}
+	for name, ts in times.items():
+		median = statistics.median(ts)
+		results[name] = 10**9 * median
+		if noise is not None:
+			noise[name] = statistics.median(abs(t - median) for t in ts) / median
+	return results
+
+def save_results(results, path, noise=None):
+	data = {'python': platform.python_version(), 'machine': platform.machine(),
+			'results': results}
+	if noise is not None:
+		data['noise'] = noise
+	with open(path, 'w') as f:
+		json.dump(data, f, indent=1, sort_keys=True)
+
+# Multiple of the combined relative noise of a benchmark (in the baseline
+# and the new results) that its slowdown must exceed to be flagged, and the
+# smallest slowdown flagged
+NOISE_SIGMAS = 4
+MIN_TOLERANCE = 0.1
+
+# Compare suite results against a baseline saved by save_results: returns
+# the benchmarks whose median is slower than the baseline's by more than
+# `tolerance`, or if tolerance is None, by more than NOISE_SIGMAS times the
+# noise of the two (at least MIN_TOLERANCE), as (name, baseline ns, new ns)
+def compare_results(results, baseline_path, tolerance=None, noise=None):
+	with open(baseline_path) as f:
+		data = json.load(f)
+	baseline = data['results']
+	baseline_noise = data.get('noise', {})
+	noise = noise or {}
+	regressions = []
+	for name in sorted(results):
+		if name not in baseline:
+			continue
+		ratio = results[name] / baseline[name]
+		if tolerance is None:
+			limit = max(MIN_TOLERANCE, NOISE_SIGMAS * math.hypot(
+				baseline_noise.get(name, 0), noise.get(name, 0)))
+		else:
+			limit = tolerance
+		if ratio > 1 + limit:
+			regressions.append((name, baseline[name], results[name]))
+			print('REGRESSION {} {:.1f} -> {:.1f} ns ({:+.0%}, limit {:+.0%})'.format(
+				name, baseline[name], results[name], ratio - 1, limit))
+	print(len(regressions), 'regressions in', len(set(results) & set(baseline)), 'benchmarks')
+	return regressions
+
+def main():
+	parser = argparse.ArgumentParser(description='Soft heap benchmarks')
+	parser.add_argument('--suite', metavar='OUT', help='run the primitive suite and write its results to OUT (JSON)')
+	parser.add_argument('--baseline', help='with --suite, flag regressions against this saved suite output')
+	parser.add_argument('--tolerance', type=float, default=None,
+						help='slowdown flagged as a regression (default: derived from the measured noise)')
+	args = parser.parse_args()
+	if args.suite:
+		noise = {}
+		results = run_suite(noise=noise)
+		flagged = []
+		if args.baseline:
+			flagged = compare_results(results, args.baseline, args.tolerance, noise)
+		save_results(results, args.suite, noise)
+		if flagged:
+			sys.exit(1)
+		return
+	run_mem_exp()
+	run_recursion_exp()
+	run_build_exp()
+	run_pop_exp()
+	run_corruption_exp()
+	run_stream_exp()
+	run_engine_exp()
+	run_counting_exp()
+	run_cancel_exp()
+	run_approx_sort_exp()
+	run_payload_exp()
+	run_snapshot_exp()
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,74 @@
+""" Parallel bulk loading of the simplified soft heap in sheap_simplified.py.
+	The keys are split into chunks, a pool of worker processes builds a soft
+	heap per chunk with insert_many, and each sub-heap comes back as the flat
+	typed arrays of SoftHeap.to_arrays rather than as a pickled object graph.
+	The parent rebuilds the sub-heaps and melds them into one heap; each chunk
+	corrupts at most eps of its keys, so the result still corrupts at most eps
+	of all the keys.
+"""
+
+import math
+import multiprocessing
+import os
+import random
+import timeit
+from array import array
+from sheap_simplified import SoftHeap
+
+"""
+To use:
+
+	sheap = parallel_from_iterable(keys, eps)	==> A Soft Heap holding keys
+													(numeric), built by
+													os.cpu_count() workers
+
+	parallel_from_iterable(keys, eps, workers=4, chunks=16, order='min')
+								==> The same, with 16 chunks
+"""
+
+
+def build_chunk(keys, eps, order):
+	# Worker: build a sub-heap of the chunk and send it back flattened
+	return SoftHeap.from_iterable(keys, eps, order=order).to_arrays()
+
+def parallel_from_iterable(keys, eps, workers=None, chunks=None, order='min'):
+	if hasattr(keys, 'tolist'):
+		keys = keys.tolist()
+	keys = array('d', keys)
+	workers = workers or os.cpu_count()
+	chunks = chunks or workers
+	step = max(1, math.ceil(len(keys) / chunks))
+	with multiprocessing.Pool(workers) as pool:
+		parts = pool.starmap(build_chunk, [(keys[lo:lo + step], eps, order)
+										   for lo in range(0, len(keys), step)])
+	sheap = SoftHeap(eps, order=order)
+	for arrays in parts:
+		sheap.meld(SoftHeap.from_arrays(arrays, eps))
+	return sheap
+
+# Run experiment on construction throughput (keys per second) of
+# parallel_from_iterable with 1 to max_workers workers, against sequential
+# insert and insert_many
+def run_build_exp(ns=(10**5, 10**6), eps=0.1, max_workers=None, number=1):
+	max_workers = max_workers or os.cpu_count()
+	data = {'x': list(ns)}
+
+	for n in ns:
+		keys = [random.random() for i in range(n)]
+		def insert():
+			sheap = SoftHeap(eps)
+			for k in keys:
+				sheap.insert(k)
+		runs = {'insert': insert,
+				'insert_many': lambda: SoftHeap.from_iterable(keys, eps)}
+		for workers in range(1, max_workers + 1):
+			runs['parallel_' + str(workers)] = lambda workers=workers: parallel_from_iterable(keys, eps, workers)
+		for name, f in runs.items():
+			t = timeit.timeit(f, number=number)/number
+			data.setdefault(name, []).append(n / t)
+			print('n', n, name, round(n / t), 'keys/s')
+
+	return data
+
+if __name__ == '__main__':
+	run_build_exp()
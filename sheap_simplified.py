@@ -4,6 +4,12 @@
 """
 
 import math
+import struct
+import sys
+import time
+from array import array
+from mmap import mmap as memory_map, ACCESS_READ
+from numbers import Real
 INF = float('inf')
 
 """
@@ -11,26 +17,170 @@ To use:
 	
 	sheap = SoftHeap(eps)		==> Make a new Soft Heap (0 <= eps < 1)
 
-	sheap.insert(7)				==> 7 is inserted
+	e = sheap.insert(7)			==> 7 is inserted; e is a handle to its item
+
+	sheap.insert(7, 'seven')	==> 7 is inserted with the payload 'seven'
+									(an item's value, which defaults to its
+									key)
+
+	sheap = SoftHeap(eps, key=f)	==> Items are inserted as (f(x), x); only the
+										cached key f(x) is ever compared
+
+	sheap = SoftHeap(eps, order='max')	==> A max heap: "min" operations work on
+											the largest keys.  Numeric keys are
+											negated and other keys wrapped in
+											Reversed as they are inserted;
+											values and the keys returned by pop
+											and find_min are the original ones
+											(the key of an item is the reversed
+											one: read its value)
+
+	sheap.delete(e)				==> Marks e's item dead in O(1); dead items are
+									discarded when they reach the front of an
+									item list
 
 	ptr, key = sheap.find_min() ==> Get a pointer to the root of minimum key
-									and its key
+									and its key (IndexError if the heap is
+									empty)
 
 	sheap.delete_min()			==> Deletes an item from the minimum key
+									(IndexError if the heap is empty)
+
+	value, key = sheap.pop()	==> Deletes an item from the minimum key and
+									returns its value and the root's key
+									(IndexError if the heap is empty)
+
+	values = sheap.delete_min_many(k)	==> Deletes k items (fewer if the heap
+											runs out) and returns their values
 
 	sheap2 = SoftHeap(eps)
-	sheap.meld(sheap2)			==> melds sheap2 into sheap1
+	sheap.meld(sheap2)			==> melds sheap2 into sheap1 (both min heaps or
+									both max heaps, and both SoftHeap or
+									both CountingSoftHeap)
+
+	sheap.insert_many(keys)		==> Inserts every key of an iterable (list,
+									generator, NumPy array) in linear time
+	sheap.insert_many(keys, values)	==> The same, with a payload per key
+	sheap = SoftHeap.from_iterable(keys, eps, key=None, order='min')
+								==> Makes a new Soft Heap holding keys
+
+	sheap.num_items				==> Number of live items in the heap (test
+									for emptiness with this rather than
+									heap != null, which sees dead items)
+	sheap.num_corrupted			==> Number of items whose node key is above
+									their own key (deleted items count
+									until they are discarded, so this can
+									exceed num_items)
+	sheap.num_roots				==> Number of trees in the root list
+
+	arrays = sheap.to_arrays()	==> The heap's nodes and items as a dict of
+									flat typed arrays (numeric keys, no
+									payloads), cheap to pickle
+	sheap = SoftHeap.from_arrays(arrays, eps)	==> Rebuilds a heap from them
+
+	sheap.dump(path)			==> Writes those arrays to a versioned binary
+									file
+	sheap = SoftHeap.load(path, mmap=False)	==> Reads a heap back; with mmap,
+												the file is memory-mapped and
+												the nodes are only rebuilt
+												when the heap is first used
+
+	sheap = CountingSoftHeap(eps, key=None, order='min', *, timed=False)
+								==> A Soft Heap that also counts links,
+									fills, defills, swaps, item-list appends
+									and roots walked (and times each
+									operation if timed)
+	stats = sheap.snapshot()	==> Those counts as a dict
 """
 
+# Default of an item's value: no payload was given, so the value is the key
+# (None is a payload like any other)
+_MISSING = object()
+
+
 class Item:
 	"""Class hat defines an item in a linked list.
 	"""
 
-	def __init__(self, it):
+	# Set on the instance once the item is deleted
+	dead = False
+
+	def __init__(self, it, value=_MISSING):
 		self.key = it
+		self.value = it if value is _MISSING else value
 		self.next = self
 
 
+class Reversed:
+	"""Key wrapper that orders keys largest first, for max heaps.  Anything it
+		is compared with that is not a Reversed key is null's INF key.
+	"""
+
+	__slots__ = ('key',)
+
+	def __init__(self, key):
+		self.key = key
+
+	def __lt__(self, other):
+		return other.__class__ is not Reversed or other.key < self.key
+
+	def __le__(self, other):
+		return other.__class__ is not Reversed or other.key <= self.key
+
+	def __gt__(self, other):
+		return other.__class__ is Reversed and other.key > self.key
+
+	def __ge__(self, other):
+		return other.__class__ is Reversed and other.key >= self.key
+
+
+def reverse_key(k):
+	# Key of k in a max heap (floats and ints first, as the ABC check is slow).
+	# NumPy unsigned and bool scalars would wrap around when negated, so they
+	# are negated as Python ints
+	cls = k.__class__
+	if cls is float or cls is int:
+		return -k
+	dtype = getattr(k, 'dtype', None)
+	if dtype is not None and dtype.kind in 'ub':
+		return -int(k)
+	if isinstance(k, Real):
+		return -k
+	return Reversed(k)
+
+def unreverse_key(k):
+	if k.__class__ is Reversed:
+		return k.key
+	return -k
+
+
+# Snapshot file header: magic, version, flags (1 = max heap, 2 = big endian),
+# eps, and the numbers of nodes, items, dead items, corrupted items and roots
+SNAPSHOT_MAGIC = b'SOFTHEAP'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct('<8sIIdQQQQQ')
+# Snapshot columns in file order, with their typecodes; each starts at a
+# multiple of 8 bytes
+SNAPSHOT_COLUMNS = (('node_key', 'd'), ('node_rank', 'q'), ('node_left', 'q'),
+					('node_right', 'q'), ('node_next', 'q'), ('node_items', 'q'),
+					('item_key', 'd'), ('item_dead', 'b'))
+
+
+class Counts:
+	"""Counts of the items, corrupted items and roots of a soft heap.  Shared
+		by the heap's roots, so that the node methods can keep them up to date.
+		Keeping them costs one key comparison per fill and per delete_min;
+		dead items are only looked for while some exist.
+	"""
+
+	def __init__(self):
+		# Items held, including dead items not yet discarded
+		self.items = 0
+		self.dead = 0
+		self.corrupted = 0
+		self.roots = 0
+
+
 class Node:
 	"""	Class that defines a heap node which can hold one or more Items,
 		and low-level helper functions.
@@ -91,39 +241,71 @@ class SoftHeapNode(Node):
 
 	def __init__(self, set=None, key=None,
 				 left=None, right=None, next=None,
-				 rank=None, T=None):
+				 rank=None, T=None, counts=None, clean=0):
 		Node.__init__(self, set, key, left, right, next)
 		self.rank = rank
 		self.T = T
+		# Counts of our heap (only kept current on roots), and the number of
+		# our items that are not corrupted, i.e. whose key equals our key
+		self.counts = counts
+		self.clean = clean
 
 	def double_even_condition(self):
 		return self.rank > self.T and self.rank % 2 == 0
 
-	def defill(self):
+	def defill(self, counts):
 		# Merge our smaller child into us; and keep doing that until
-		# we've merged in a leaf
-		self.fill()
+		# we've merged in a leaf.  counts are those of our heap, as only
+		# roots keep theirs current
+		self.fill(counts)
 		# If our rank is even and greater than T, do it again
 		if self.double_even_condition() and not self.is_leaf():
-			self.fill()
+			self.fill(counts)
 
-	def fill(self):
+	def fill(self, counts):
 		# Ensure our left child has the smaller key of our two children
 		if self.left.key > self.right.key:
 			self.swap_children()
-		# Merge our left child into us (we may or may not already have items)
-		self.absorb_left_key()
-		if not self.has_items():
+		left = self.left
+		# Its dead items at the front would come first in our list: drop them.
+		# Dead items further down its list are appended with the rest, and
+		# only dropped once they reach the front of a root's list
+		if counts.dead:
+			left.discard_dead_items(counts)
+		# Merge our left child into us (we may or may not already have items).
+		# The left child's items keep their key, so only our own clean items
+		# can become corrupted, when our key goes up
+		if self.set == SoftHeap.null:
+			self.clean = left.clean
+			self.key = left.key
 			self.absorb_left_items()
 		else:
+			if left.key > self.key:
+				counts.corrupted += self.clean
+				self.clean = left.clean
+			else:
+				self.clean += left.clean
+			self.key = left.key
 			self.append_left_items()
 		# If our left child is now a leaf, destroy it and move our
 		# right child in its place
-		if self.left.is_leaf(): 
+		if left.left == SoftHeap.null:
 			self.move_right_child_left()
 		# Otherwise, call defill on it
 		else:
-			self.left.defill()
+			left.defill(counts)
+
+	def discard_dead_items(self, counts):
+		# Wire out dead items from the front of our item list, keeping at
+		# least one item so that we keep our key
+		while self.has_multiple_items() and self.first_item().dead:
+			if self.first_item().key < self.key:
+				counts.corrupted -= 1
+			else:
+				self.clean -= 1
+			counts.items -= 1
+			counts.dead -= 1
+			self.wire_out_first_item()
 
 	def find_min(self):
 		# Assume findable order; we are root of minimum key (of the heap
@@ -154,6 +336,17 @@ class SoftHeapNode(Node):
 		# Assume findable order; we are the root with minimum key
 		# If we have more than one item, wire out the first_item element and
 		# return it
+		counts = self.counts
+		counts.items -= 1
+		first = self.first_item()
+		if first.key < self.key:
+			counts.corrupted -= 1
+		else:
+			self.clean -= 1
+		if first.dead:
+			counts.dead -= 1
+		else:
+			first.dead = True
 		if self.has_multiple_items(): 
 			self.wire_out_first_item()
 			return self
@@ -164,12 +357,13 @@ class SoftHeapNode(Node):
 			k = self.rank
 			# If we are a leaf, make ourselves the next tree
 			if self.is_leaf(): 
+				counts.roots -= 1
 				L = self.next
 				self = L
 			# If we are not a leaf, raise small child (recursively),
 			# and if we have an even rank beyond T, do this again
 			else:
-				self.defill()
+				self.defill(counts)
 			# Restore findable order
 			return self.reorder(k)
 
@@ -188,7 +382,9 @@ class SoftHeapNode(Node):
 		e.next = e
 		x = SoftHeapNode(set=e, key=e.key,
 						 left=SoftHeap.null, right=SoftHeap.null, next=SoftHeap.null,
-						 rank=0, T= self.T)
+						 rank=0, T= self.T, counts=self.counts, clean=1)
+		self.counts.items += 1
+		self.counts.roots += 1
 		return x
 
 	def insert(self, it):
@@ -214,13 +410,15 @@ class SoftHeapNode(Node):
 
 	def link(self, y):
 		# Make a new node with 1 bigger rank than us and y
-		z = SoftHeapNode(set=SoftHeap.null,
-					 	 rank=self.rank + 1,
-					 	 left=self,
-					 	 right=y,
-					 	 T=self.T)
+		z = type(self)(set=SoftHeap.null,
+					   rank=self.rank + 1,
+					   left=self,
+					   right=y,
+					   T=self.T,
+					   counts=self.counts)
+		self.counts.roots -= 1
 		# Set the new node's children to us and y, and merge up small children
-		z.defill()
+		z.defill(self.counts)
 		return z
 
 	def meld(self, other):
@@ -251,9 +449,25 @@ class SoftHeap:
 	null.left = null
 	null.right = null
 	null.next = null
+	# Counts of the null node, which no heap reads
+	null.counts = Counts()
+
+	# Class of the heap nodes
+	node = SoftHeapNode
 
-	def __init__(self, eps):
+	def __init__(self, eps, key=None, order='min'):
 		self.eps = eps
+		# Key function, applied once per item at insert time.  A max heap
+		# reverses the keys there, so that no comparison changes
+		if order == 'max':
+			if key is None:
+				key = reverse_key
+			else:
+				key = lambda x, key=key: reverse_key(key(x))
+		elif order != 'min':
+			raise Exception('Unknown order ' + str(order))
+		self.key = key
+		self.order = order
 		if self.eps == 0:
 			self.T = INF
 		else:
@@ -261,16 +475,471 @@ class SoftHeap:
 		self.heap = SoftHeapNode()
 		self.heap = SoftHeap.null
 		self.heap.T = self.T
-
-	def insert(self, it):
-		self.heap = self.heap.insert(it)
+		self.counts = Counts()
+
+	@property
+	def num_items(self):
+		return self.counts.items - self.counts.dead
+
+	@property
+	def num_corrupted(self):
+		# Items whose key is below the key of the node holding them.  A
+		# deleted item's node is not known when it is deleted, so dead items
+		# count here until they are discarded
+		return self.counts.corrupted
+
+	@property
+	def num_roots(self):
+		return self.counts.roots
+
+	def insert(self, it, value=_MISSING):
+		# Make the root here, so that it has our node class, T and counts
+		# even when the heap is empty.  Returns the item as a handle
+		if self.key is not None:
+			if value is _MISSING:
+				value = it
+			it = self.key(it)
+		e = Item(it, value)
+		x = self.node(set=e, key=it,
+					  left=SoftHeap.null, right=SoftHeap.null, next=SoftHeap.null,
+					  rank=0, T=self.T, counts=self.counts, clean=1)
+		self.counts.items += 1
+		self.counts.roots += 1
+		self.heap = self.heap.rank_swap().meldable_insert(x).key_swap()
+		return e
+
+	def delete(self, e):
+		# Mark the item of handle e dead; it stays in its item list (and in
+		# num_corrupted) until it reaches the front.  Items already deleted
+		# are left alone
+		if not e.dead:
+			e.dead = True
+			self.counts.dead += 1
+
+	def discard_dead(self):
+		# Delete dead items from the front of the minimum root until its
+		# first item is live (or the heap is empty)
+		h = self.heap
+		while h != SoftHeap.null and h.first_item().dead:
+			h = h.delete_min()
+		self.heap = h
+
+	@classmethod
+	def from_iterable(cls, keys, eps, key=None, order='min'):
+		sheap = cls(eps, key=key, order=order)
+		sheap.insert_many(keys)
+		return sheap
+
+	def insert_many(self, keys, values=None):
+		# Link the new roots into trees like a binary counter (slots[k] holds
+		# the pending tree of rank k), lay the trees out once as a root list
+		# in findable order, and meld that in
+		if hasattr(keys, 'tolist'):
+			# NumPy arrays: compare Python scalars rather than NumPy ones
+			keys = keys.tolist()
+		# As with insert, a key function takes the keys as the values unless
+		# values are given
+		if self.key is not None:
+			key = self.key
+			if values is None:
+				items = (Item(key(x), x) for x in keys)
+			else:
+				items = (Item(key(x), v) for x, v in zip(keys, values))
+		elif values is None:
+			items = map(Item, keys)
+		else:
+			items = map(Item, keys, values)
+		null = SoftHeap.null
+		slots = []
+		for e in items:
+			it = e.key
+			x = self.node(set=e, key=it,
+						  left=null, right=null, next=null,
+						  rank=0, T=self.T, counts=self.counts, clean=1)
+			self.counts.items += 1
+			self.counts.roots += 1
+			k = 0
+			while k < len(slots) and slots[k] is not None:
+				x = slots[k].link(x)
+				slots[k] = None
+				k += 1
+			if k == len(slots):
+				slots.append(x)
+			else:
+				slots[k] = x
+		h = null
+		for x in reversed(slots):
+			if x is not None:
+				x.next = h
+				h = x.key_swap()
+		self.heap = self.heap.meld(h)
 
 	def find_min(self):
-		return self.heap.find_min()
+		if self.counts.dead:
+			self.discard_dead()
+		if self.heap == SoftHeap.null:
+			raise IndexError('find_min from empty soft heap')
+		ptr, key = self.heap.find_min()
+		if self.order == 'max':
+			key = unreverse_key(key)
+		return (ptr, key)
 
 	def delete_min(self):
+		if self.counts.dead:
+			self.discard_dead()
+		if self.heap == SoftHeap.null:
+			raise IndexError('delete_min from empty soft heap')
 		self.heap = self.heap.delete_min()
 
+	def pop(self):
+		# Delete an item from the minimum key, and return its value and the
+		# key of the root it was deleted from
+		if self.counts.dead:
+			self.discard_dead()
+		if self.heap == SoftHeap.null:
+			raise IndexError('pop from empty soft heap')
+		h = self.heap
+		if self.order == 'max':
+			popped = (h.first_item().value, unreverse_key(h.key))
+		else:
+			popped = (h.first_item().value, h.key)
+		self.heap = h.delete_min()
+		return popped
+
+	def delete_min_many(self, k):
+		# Delete k items (fewer if the heap runs out) and return their values,
+		# in the order k calls to delete_min would delete them.  Items are
+		# taken straight off the minimum root's item list; the root is only
+		# refilled and the findable order restored when that list empties
+		values = []
+		counts = self.counts
+		h = self.heap
+		while k > 0 and h != SoftHeap.null:
+			last = h.set
+			it = last.next
+			while it is not last:
+				# Dead items are discarded without counting towards k
+				if it.dead:
+					counts.dead -= 1
+				elif k > 1:
+					values.append(it.value)
+					it.dead = True
+					k -= 1
+				else:
+					break
+				if it.key < h.key:
+					counts.corrupted -= 1
+				else:
+					h.clean -= 1
+				counts.items -= 1
+				it = it.next
+			last.next = it
+			if not it.dead:
+				values.append(it.value)
+				k -= 1
+			h = h.delete_min()
+		self.heap = h
+		return values
+
 	def meld(self, other):
+		# Our roots must share our counts, since links and deletions only
+		# update the counts of roots; the other heap's inner nodes never
+		# read theirs again.  The heaps must order their keys the same way,
+		# and have the same node class (a counting node needs OpCounts)
+		if other.order != self.order:
+			raise Exception('Cannot meld a {} heap into a {} heap'.format(other.order, self.order))
+		if other.node is not self.node:
+			raise Exception('Cannot meld a {} into a {}'.format(type(other).__name__, type(self).__name__))
+		x = other.heap
+		while x != SoftHeap.null:
+			x.counts = self.counts
+			x = x.next
+		self.counts.items += other.counts.items
+		self.counts.dead += other.counts.dead
+		self.counts.corrupted += other.counts.corrupted
+		self.counts.roots += other.counts.roots
 		self.heap = self.heap.meld(other.heap)
 
+	def to_arrays(self):
+		# Number the nodes tree by tree along the root list, each tree in
+		# preorder, and lay out their fields and item lists (first item
+		# first) as columns; -1 stands for null.  Only roots keep a next:
+		# inner nodes' next pointers are stale
+		null = SoftHeap.null
+		node_key = array('d')
+		node_rank = array('q')
+		node_left = array('q')
+		node_right = array('q')
+		node_next = array('q')
+		node_items = array('q', [0])
+		item_key = array('d')
+		item_dead = array('b')
+		max_heap = self.order == 'max'
+		index = {}
+		order = []
+		roots = []
+		h = self.heap
+		while h != null:
+			roots.append(h)
+			stack = [h]
+			while stack:
+				x = stack.pop()
+				index[x] = len(order)
+				order.append(x)
+				for y in (x.right, x.left):
+					if y != null:
+						stack.append(y)
+			h = h.next
+		for x in order:
+			node_key.append(x.key)
+			node_rank.append(x.rank)
+			node_left.append(index[x.left] if x.left != null else -1)
+			node_right.append(index[x.right] if x.right != null else -1)
+			node_next.append(-1)
+			if x.has_items():
+				it = x.first_item()
+				while True:
+					if it.value is not it.key and it.value != (-it.key if max_heap else it.key):
+						raise Exception('Cannot flatten items with payloads')
+					item_key.append(it.key)
+					item_dead.append(it.dead)
+					if it is x.set:
+						break
+					it = it.next
+			node_items.append(len(item_key))
+		for x, y in zip(roots, roots[1:]):
+			node_next[index[x]] = index[y]
+		return {'order': self.order, 'node_key': node_key, 'node_rank': node_rank,
+				'node_left': node_left, 'node_right': node_right, 'node_next': node_next,
+				'node_items': node_items, 'item_key': item_key, 'item_dead': item_dead}
+
+	@classmethod
+	def from_arrays(cls, arrays, eps):
+		sheap = cls(eps, order=arrays['order'])
+		sheap.set_arrays(arrays)
+		return sheap
+
+	def set_arrays(self, arrays):
+		# Inverse of to_arrays, into this (empty) heap; the counts are
+		# recomputed from the items
+		null = SoftHeap.null
+		counts = self.counts
+		node_key = arrays['node_key']
+		node_items = arrays['node_items']
+		item_key = arrays['item_key']
+		item_dead = arrays['item_dead']
+		max_heap = self.order == 'max'
+		nodes = [self.node(key=key, rank=rank, T=self.T, counts=counts)
+				 for key, rank in zip(node_key, arrays['node_rank'])]
+		# Index -1 picks null off the end
+		lookup = nodes + [null]
+		corrupted = 0
+		dead = 0
+		for x, l, r, nx, lo, hi in zip(nodes, arrays['node_left'], arrays['node_right'],
+									   arrays['node_next'], node_items, node_items[1:]):
+			x.left = lookup[l]
+			x.right = lookup[r]
+			x.next = lookup[nx]
+			if lo == hi:
+				x.set = null
+				continue
+			key = x.key
+			clean = 0
+			first = last = None
+			for j in range(lo, hi):
+				k = item_key[j]
+				e = Item(k, -k) if max_heap else Item(k)
+				if item_dead[j]:
+					e.dead = True
+					dead += 1
+				if k < key:
+					corrupted += 1
+				else:
+					clean += 1
+				if first is None:
+					first = e
+				else:
+					last.next = e
+				last = e
+			last.next = first
+			x.set = last
+			x.clean = clean
+		counts.items = len(item_key)
+		counts.dead = dead
+		counts.corrupted = corrupted
+		counts.roots = 0
+		self.heap = nodes[0] if nodes else null
+		x = self.heap
+		while x != null:
+			counts.roots += 1
+			x = x.next
+
+	def dump(self, path):
+		arrays = self.to_arrays()
+		flags = (self.order == 'max') | (sys.byteorder == 'big') << 1
+		c = self.counts
+		header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, flags, self.eps,
+									  len(arrays['node_key']), c.items, c.dead, c.corrupted, c.roots)
+		with open(path, 'wb') as f:
+			f.write(header)
+			for name, typecode in SNAPSHOT_COLUMNS:
+				f.write(b'\0' * (-f.tell() % 8))
+				arrays[name].tofile(f)
+
+	@classmethod
+	def load(cls, path, mmap=False):
+		with open(path, 'rb') as f:
+			if mmap:
+				buf = memory_map(f.fileno(), 0, access=ACCESS_READ)
+			else:
+				buf = f.read()
+		magic, version, flags, eps, nodes, items, dead, corrupted, roots = \
+			SNAPSHOT_HEADER.unpack_from(buf)
+		if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+			raise Exception('Not a version {} soft heap snapshot: {}'.format(SNAPSHOT_VERSION, path))
+		if bool(flags & 2) != (sys.byteorder == 'big'):
+			raise Exception('Snapshot has the wrong byte order: ' + path)
+		sheap = cls(eps, order='max' if flags & 1 else 'min')
+		sizes = {'node_items': nodes + 1, 'item_key': items, 'item_dead': items}
+		arrays = {'order': sheap.order}
+		offset = SNAPSHOT_HEADER.size
+		view = memoryview(buf)
+		for name, typecode in SNAPSHOT_COLUMNS:
+			offset += -offset % 8
+			size = sizes.get(name, nodes) * array(typecode).itemsize
+			column = view[offset:offset + size].cast(typecode)
+			# Without mmap, copy into arrays so the file buffer can go
+			arrays[name] = column if mmap else array(typecode, column)
+			offset += size
+		if not mmap:
+			sheap.set_arrays(arrays)
+			return sheap
+		# Rebuild the nodes when the heap is first used (see __getattr__);
+		# the counts are known already
+		del sheap.heap
+		sheap.pending = arrays
+		c = sheap.counts
+		c.items, c.dead, c.corrupted, c.roots = items, dead, corrupted, roots
+		return sheap
+
+	def __getattr__(self, name):
+		# Only called for attributes we do not have: the heap of a snapshot
+		# loaded with mmap, before it is rebuilt
+		pending = self.__dict__.get('pending')
+		if name != 'heap' or pending is None:
+			raise AttributeError(name)
+		del self.pending
+		self.set_arrays(pending)
+		return self.heap
+
+
+class OpCounts(Counts):
+	"""Counts of a CountingSoftHeap, with the work done by its nodes.
+	"""
+
+	def __init__(self):
+		Counts.__init__(self)
+		self.links = 0
+		self.fills = 0
+		self.defills = 0
+		self.rank_swaps = 0
+		self.key_swaps = 0
+		self.appends = 0
+		# Every rank_swap or key_swap looks at one link of the root list
+		self.roots_walked = 0
+
+
+class CountingSoftHeapNode(SoftHeapNode):
+	"""Heap node that counts its work in the OpCounts of its heap.  Kept
+		apart from SoftHeapNode so that uninstrumented heaps pay nothing.
+	"""
+
+	def defill(self, counts):
+		counts.defills += 1
+		SoftHeapNode.defill(self, counts)
+
+	def fill(self, counts):
+		counts.fills += 1
+		if self.has_items():
+			counts.appends += 1
+		SoftHeapNode.fill(self, counts)
+
+	def rank_swap(self):
+		x = SoftHeapNode.rank_swap(self)
+		self.counts.roots_walked += 1
+		if x is not self:
+			self.counts.rank_swaps += 1
+		return x
+
+	def key_swap(self):
+		x = SoftHeapNode.key_swap(self)
+		self.counts.roots_walked += 1
+		if x is not self:
+			self.counts.key_swaps += 1
+		return x
+
+	def link(self, y):
+		self.counts.links += 1
+		return SoftHeapNode.link(self, y)
+
+
+class CountingSoftHeap(SoftHeap):
+	"""Soft heap that records the work of each operation: calls, roots
+		walked and, if timed, seconds.  Choose it over SoftHeap at
+		construction to instrument a heap.
+	"""
+
+	node = CountingSoftHeapNode
+
+	def __init__(self, eps, key=None, order='min', *, timed=False):
+		SoftHeap.__init__(self, eps, key, order)
+		self.counts = OpCounts()
+		self.timed = timed
+		# Per operation name: calls, roots walked, seconds
+		self.ops = {}
+
+	def record(self, op, f, *args):
+		counts = self.counts
+		walked = counts.roots_walked
+		if self.timed:
+			t = time.perf_counter()
+			result = f(self, *args)
+			seconds = time.perf_counter() - t
+		else:
+			result = f(self, *args)
+			seconds = 0.0
+		stats = self.ops.setdefault(op, {'calls': 0, 'roots_walked': 0, 'seconds': 0.0})
+		stats['calls'] += 1
+		stats['roots_walked'] += counts.roots_walked - walked
+		stats['seconds'] += seconds
+		return result
+
+	def insert(self, it, value=_MISSING):
+		return self.record('insert', SoftHeap.insert, it, value)
+
+	def insert_many(self, keys, values=None):
+		return self.record('insert_many', SoftHeap.insert_many, keys, values)
+
+	def find_min(self):
+		return self.record('find_min', SoftHeap.find_min)
+
+	def delete_min(self):
+		return self.record('delete_min', SoftHeap.delete_min)
+
+	def pop(self):
+		return self.record('pop', SoftHeap.pop)
+
+	def delete_min_many(self, k):
+		return self.record('delete_min_many', SoftHeap.delete_min_many, k)
+
+	def delete(self, e):
+		return self.record('delete', SoftHeap.delete, e)
+
+	def meld(self, other):
+		return self.record('meld', SoftHeap.meld, other)
+
+	def snapshot(self):
+		# Plain dict of the counts, for export
+		stats = dict(vars(self.counts))
+		stats['ops'] = {op: dict(s) for op, s in self.ops.items()}
+		return stats
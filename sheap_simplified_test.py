@@ -1,5 +1,10 @@
+import os
+import pickle
 import random
-from sheap_simplified import SoftHeap
+import struct
+import tempfile
+import numpy as np
+from sheap_simplified import CountingSoftHeap, SoftHeap
 
 def randlist(n):
 	return [ random.random() for i in range(n) ]
@@ -7,38 +12,213 @@ def randlist(n):
 def randperm(n):
 	return random.sample(list(range(n)),n)
 
-def build(lst, eps):
-	P = SoftHeap(eps)
-	for it in lst:
-		P.insert(it)
-	return P
+def build(lst, eps, heap_class=SoftHeap, order='min'):
+	if order == 'min':
+		return heap_class.from_iterable(lst, eps)
+	return heap_class.from_iterable(lst, eps, order=order)
 
 def extract(P):
+	# The items of a max heap hold the reversed keys; their values are the
+	# original ones
+	max_heap = getattr(P, 'order', 'min') == 'max'
 	lst = [];
-	while P.heap != SoftHeap.null:
-		lst.append(P.find_min()[0].key)
+	while P.heap != P.null:
+		ptr = P.find_min()[0]
+		lst.append(ptr.value if max_heap else ptr.key)
 		P.delete_min()
 	return lst
 		
-def sort(lst, eps):
-	print(lst)
-	P = build(lst, eps)
+def sort(lst, eps, heap_class=SoftHeap, verbose=True, order='min'):
+	if verbose:
+		print(lst)
+	P = build(lst, eps, heap_class, order)
 	lst1 = extract(P)
 	if P.eps == 0:
 		for i in range(1,len(lst)):
-			if lst1[i]<lst1[i-1]:
+			if (lst1[i]<lst1[i-1]) if order == 'min' else (lst1[i]>lst1[i-1]):
 				print("BUG!!!")
 				raise BUG()
-	print(lst1)
-	print(" ")
+	if verbose:
+		print(lst1)
+		print(" ")
 	return lst1
 
+def raises(f, *args):
+	try:
+		f(*args)
+	except Exception:
+		return True
+	return False
+
+def test_max_heap_unsigned():
+	# NumPy unsigned and bool scalars must not wrap around when reversed
+	P = SoftHeap(0, order='max')
+	P.insert(np.uint8(3))
+	assert P.find_min()[1] == 3
+	keys = list(np.random.permutation(100).astype(np.uint8))
+	assert extract(build(keys, 0, order='max')) == list(range(99, -1, -1))
+	assert extract(build([np.True_, np.False_, np.True_], 0, order='max')) == [True, True, False]
+
+def test_meld_orders():
+	# Reversed and plain keys must never share a heap
+	P = build([1, 2], 0)
+	assert raises(P.meld, build([3], 0, order='max'))
+	assert raises(build([3], 0, order='max').meld, P)
+	P.meld(build([0], 0))
+	assert extract(P) == [0, 1, 2]
+
+def test_counting_heap():
+	keys = randperm(500)
+	P = build(keys, 0.2, CountingSoftHeap)
+	stats = P.snapshot()
+	# Every link makes one root out of two
+	assert stats['items'] == 500 and stats['links'] == 500 - stats['roots']
+	assert stats['ops']['insert_many']['calls'] == 1
+	assert stats['fills'] >= stats['appends']
+	# The counts don't change the heap's work
+	assert extract(P) == extract(build(keys, 0.2))
+	stats = P.snapshot()
+	assert stats['ops']['delete_min']['calls'] == 500 and stats['items'] == 0
+	assert stats['ops']['find_min']['roots_walked'] == 0
+	# timed is keyword-only
+	assert raises(CountingSoftHeap, 0.2, None, 'min', True)
+	Q = CountingSoftHeap(0.2, timed=True)
+	Q.insert(1)
+	assert Q.snapshot()['ops']['insert']['seconds'] >= 0
+
+def test_meld_counting():
+	# Counting nodes need the counters of a CountingSoftHeap
+	assert raises(build([1], 0).meld, build([2], 0, CountingSoftHeap))
+	assert raises(build([1], 0, CountingSoftHeap).meld, build([2], 0))
+	P = build(randperm(100), 0, CountingSoftHeap)
+	P.meld(build(list(range(100, 200)), 0, CountingSoftHeap))
+	assert P.snapshot()['ops']['meld']['calls'] == 1
+	assert extract(P) == list(range(200))
+
+def drain(P):
+	# Like extract, but stops at the live items, since find_min discards
+	# the dead ones
+	lst = []
+	while P.num_items:
+		lst.append(P.find_min()[0].key)
+		P.delete_min()
+	return lst
+
+def test_delete():
+	P = SoftHeap(0)
+	handles = [P.insert(k) for k in randperm(100)]
+	dead = [e for e in handles if e.key % 3 == 0]
+	for e in dead:
+		P.delete(e)
+	# Deleting twice is a no-op
+	P.delete(dead[0])
+	assert P.num_items == 66
+	assert drain(P) == [k for k in range(100) if k % 3]
+	# The dead items left are discarded on the way to raising
+	assert P.num_items == 0
+	assert raises(P.find_min)
+	assert P.heap == P.null and P.counts.items == 0
+
+def test_dead_items():
+	# Dead items are skipped by delete_min_many and carried through meld
+	P = SoftHeap(0.3)
+	handles = [P.insert(k) for k in range(200)]
+	for e in handles[::2]:
+		P.delete(e)
+	assert P.num_items == 100
+	# Corruption counts the dead items too, until they are discarded
+	assert 0 <= P.num_corrupted <= P.counts.items
+	values = P.delete_min_many(10)
+	assert len(values) == 10 and all(v % 2 for v in values)
+	assert P.num_items == 90
+	Q = SoftHeap(0.3)
+	for e in [Q.insert(k) for k in range(200, 300)][:50]:
+		Q.delete(e)
+	P.meld(Q)
+	assert P.num_items == 140
+	lst = drain(P)
+	assert len(lst) == 140 and set(lst) <= set(range(1, 200, 2)) | set(range(250, 300))
+	assert P.counts.items == P.counts.dead == P.num_corrupted == 0
+
+def values(P):
+	# Values of the live items, in pop order
+	lst = []
+	while P.num_items:
+		lst.append(P.pop()[0])
+	return lst
+
+def test_to_arrays():
+	# from_arrays rebuilds the same structure, which flattens to the same
+	# arrays again; payloads other than the key cannot be flattened
+	P = SoftHeap(0.3)
+	for e in [P.insert(k) for k in randlist(400)][::4]:
+		P.delete(e)
+	for P in (P, build(randlist(400), 0.2, order='max'), SoftHeap(0.2)):
+		arrays = pickle.loads(pickle.dumps(P.to_arrays()))
+		Q = SoftHeap.from_arrays(arrays, P.eps)
+		assert Q.to_arrays() == P.to_arrays()
+		assert (Q.num_items, Q.num_corrupted, Q.num_roots, Q.order) == (P.num_items, P.num_corrupted, P.num_roots, P.order)
+		assert values(Q) == values(P)
+	P = SoftHeap(0.2)
+	P.insert(1, 'payload')
+	assert raises(P.to_arrays)
+
+def test_dump_load():
+	heaps = [build(randlist(500), 0.2), build(randlist(500), 0.2, order='max'), SoftHeap(0.2)]
+	# A heap with dead items
+	P = SoftHeap(0.3)
+	for e in [P.insert(k) for k in randperm(300)][::3]:
+		P.delete(e)
+	heaps.append(P)
+	with tempfile.TemporaryDirectory() as tmp:
+		path = os.path.join(tmp, 'heap.bin')
+		for P in heaps:
+			P.dump(path)
+			loaded = [SoftHeap.load(path), SoftHeap.load(path, mmap=True)]
+			for Q in loaded:
+				assert (Q.eps, Q.order) == (P.eps, P.order)
+				assert (Q.num_items, Q.num_corrupted, Q.num_roots) == (P.num_items, P.num_corrupted, P.num_roots)
+				assert (Q.counts.items, Q.counts.dead) == (P.counts.items, P.counts.dead)
+			# The same items come out in the same order as from the heap
+			# that was dumped
+			lst = values(P)
+			for Q in loaded:
+				assert values(Q) == lst
+
+def test_load_rejects():
+	with tempfile.TemporaryDirectory() as tmp:
+		path = os.path.join(tmp, 'heap.bin')
+		build(randlist(50), 0.2).dump(path)
+		with open(path, 'rb') as f:
+			data = f.read()
+		flags = struct.unpack_from('<I', data, 12)[0]
+		bad = {'magic': b'NOTAHEAP' + data[8:],
+			   'version': data[:8] + struct.pack('<I', 2) + data[12:],
+			   'byte order': data[:12] + struct.pack('<I', flags ^ 2) + data[16:]}
+		for name, data in bad.items():
+			with open(path, 'wb') as f:
+				f.write(data)
+			for mmap in (False, True):
+				assert raises(SoftHeap.load, path, mmap), name
+
 
 if __name__ == "__main__":
 
 	sort(randperm(30), 0)
 	sort(randperm(30), 0.1)
 	sort(randperm(30), 0.5)
+	sort(randperm(30), 0, order='max')
+	assert extract(build([3, 9, 1], 0, order='max')) == [9, 3, 1]
+
+	test_max_heap_unsigned()
+	test_meld_orders()
+	test_counting_heap()
+	test_meld_counting()
+	test_delete()
+	test_dead_items()
+	test_to_arrays()
+	test_dump_load()
+	test_load_rejects()
 
 	P=build(randperm(100), 0)
 	Q=build(randperm(200), 0)
@@ -0,0 +1,67 @@
+""" Approximate sorting with the simplified soft heap in sheap_simplified.py.
+	The values are bulk loaded into a soft heap with error rate eps and drained
+	in batches.  When a value is deleted, every value still in the heap with a
+	smaller key is corrupted, so each value has at most eps * n smaller values
+	after it in the output (eps * n^2 inversions in total), and eps = 0 sorts.
+"""
+
+import numpy as np
+from sheap_simplified import SoftHeap
+
+"""
+To use:
+
+	for x in approx_sort(values, eps):	==> Values (list, iterable or NumPy
+		...								array) in near-sorted order
+
+	arr = approx_sort(values, eps, array=True)	==> The same as a NumPy array
+													(of the input's dtype for
+													NumPy input)
+
+	approx_sort(records, eps, key=f)	==> Orders the records by f(record)
+
+	total, worst = inversions(seq)	==> Number of inversions of seq, and the
+										most inversions any one value is in
+										as the larger value
+"""
+
+
+def approx_sort(data, eps, batch=1024, array=False, key=None):
+	# Soft heap drain of data, as a generator of values or a NumPy array.
+	# A key function is called once per value, as for sorted()
+	dtype = data.dtype if isinstance(data, np.ndarray) else None
+	P = SoftHeap.from_iterable(data, eps, key=key)
+	if array:
+		return np.array(P.delete_min_many(P.num_items), dtype=dtype)
+	return drain(P, batch)
+
+
+def drain(P, batch):
+	# Values of P, deleted batch at a time
+	while P.num_items > 0:
+		yield from P.delete_min_many(batch)
+
+
+def inversions(seq):
+	# Scan from the right, counting the smaller values seen so far with a
+	# Fenwick tree over the ranks of the distinct values
+	if isinstance(seq, np.ndarray):
+		seq = seq.tolist()
+	rank = {x: i + 1 for i, x in enumerate(sorted(set(seq)))}
+	tree = [0] * (len(rank) + 1)
+	total = 0
+	worst = 0
+	for x in reversed(seq):
+		r = rank[x]
+		i = r - 1
+		c = 0
+		while i > 0:
+			c += tree[i]
+			i -= i & -i
+		total += c
+		if c > worst:
+			worst = c
+		while r < len(tree):
+			tree[r] += 1
+			r += r & -r
+	return total, worst
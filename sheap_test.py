@@ -0,0 +1,132 @@
+import random
+import numpy as np
+import sheap
+import sheap_arena
+import sheap_simplified
+from sheap_parallel import parallel_from_iterable
+from sheap_sort import approx_sort, inversions
+from sheap_stream import QuantileStream
+
+# The soft heap engines behind linear_select's backend switch
+ENGINES = (sheap_simplified.SoftHeap, sheap.SoftHeap, sheap_arena.SoftHeap)
+
+def raises_index_error(f):
+	try:
+		f()
+	except IndexError:
+		return True
+	return False
+
+def test_empty_heap():
+	# find_min, delete_min and pop raise IndexError on an empty heap, whether
+	# it never held items or was drained; delete_min_many returns no keys
+	for SoftHeap in ENGINES:
+		for P in (SoftHeap(0.1), SoftHeap.from_iterable([3, 1, 2], 0.1)):
+			P.delete_min_many(3)
+			assert P.num_items == 0
+			assert P.heap == P.null
+			for f in (P.find_min, P.delete_min, P.pop):
+				assert raises_index_error(f), (SoftHeap, f)
+			assert len(P.delete_min_many(5)) == 0
+
+def test_delete_min_returns_none():
+	# delete_min only deletes; pop is the call that returns the key
+	for SoftHeap in ENGINES:
+		P = SoftHeap.from_iterable([5, 4, 6], 0)
+		assert P.delete_min() is None
+		assert P.pop()[0] == 5
+		assert P.find_min()[1] == 6
+		assert P.num_items == 1
+
+def test_quantile_stream():
+	# Ranks are off by at most error <= eps/2 * n, quantiles by at most eps * n
+	n = 20000
+	values = [random.random() for i in range(n)]
+	ordered = sorted(values)
+	for eps in (0.2, 0.05):
+		qs = QuantileStream(eps, k=5)
+		qs.extend(iter(values[:n // 2]))
+		for x in values[n // 2:]:
+			qs.update(x)
+		assert qs.n == n and qs.error <= eps / 2 * n
+		for i in range(0, n, 997):
+			assert abs(qs.rank(ordered[i]) - (i + 1)) <= qs.error
+		for q in (0.01, 0.5, 0.99):
+			r = ordered.index(qs.quantile(q)) + 1
+			assert abs(r - q * n) <= eps * n
+		# The largest values are kept exactly
+		assert qs.top(5) == ordered[:-6:-1]
+		assert qs.top(2) == ordered[:-3:-1]
+		try:
+			qs.top(6)
+		except Exception:
+			pass
+		else:
+			assert False
+
+def test_parallel_from_iterable():
+	# Chunks built in worker processes and melded hold every key once
+	keys = [random.random() for i in range(3000)]
+	for eps, order in ((0, 'min'), (0, 'max'), (0.2, 'min')):
+		P = parallel_from_iterable(keys, eps, workers=2, chunks=3, order=order)
+		assert P.num_items == 3000 and P.order == order
+		popped = [P.pop()[0] for i in range(3000)]
+		assert P.num_items == 0
+		assert sorted(popped) == sorted(keys)
+		if eps == 0:
+			assert popped == sorted(keys, reverse=order == 'max')
+
+def test_approx_sort():
+	# Each value has at most eps * n smaller values after it; eps = 0 sorts
+	n = 3000
+	values = [random.random() for i in range(n)]
+	for eps in (0, 0.01, 0.1, 0.3):
+		out = list(approx_sort(values, eps, batch=100))
+		assert sorted(out) == sorted(values)
+		total, worst = inversions(out)
+		assert worst <= eps * n and total <= eps * n * n
+		if eps == 0:
+			assert total == 0
+	assert inversions([3, 1, 2]) == (2, 2)
+	# NumPy input keeps its dtype; a key function orders records
+	arr = np.random.permutation(n).astype(np.int32)
+	out = approx_sort(arr, 0.1, array=True)
+	assert out.dtype == np.int32 and inversions(out)[1] <= 0.1 * n
+	records = [(str(x), x) for x in range(100)]
+	random.shuffle(records)
+	assert list(approx_sort(records, 0, key=lambda r: r[1])) == sorted(records, key=lambda r: r[1])
+
+def test_arena_meld():
+	# Heaps in different arenas meld by copying the other heap's nodes; heaps
+	# sharing an arena meld in place.  Either way every key comes out once
+	keys = [random.random() for i in range(2000)]
+	for eps in (0, 0.2):
+		for shared in (False, True):
+			arena = sheap_arena.Arena() if shared else None
+			P = sheap_arena.SoftHeap.from_iterable(keys[:1200], eps, arena=arena)
+			Q = sheap_arena.SoftHeap.from_iterable(keys[1200:], eps, arena=arena)
+			assert (P.arena is Q.arena) == shared
+			nodes = len(P.arena.node_key)
+			corrupted = P.num_corrupted + Q.num_corrupted
+			P.meld(Q)
+			# Linking the melded trees can only corrupt more items
+			assert P.num_items == 2000 and P.num_corrupted >= corrupted
+			if not shared:
+				assert len(P.arena.node_key) > nodes
+			popped = [P.pop()[0] for i in range(2000)]
+			assert sorted(popped) == sorted(keys)
+			if eps == 0:
+				assert popped == sorted(keys)
+			# The deleted items' slots are reused (slot 0 is the null item)
+			P.insert(0.5)
+			assert len(P.arena.item_key) == 2001
+
+
+if __name__ == "__main__":
+
+	test_empty_heap()
+	test_delete_min_returns_none()
+	test_quantile_stream()
+	test_parallel_from_iterable()
+	test_approx_sort()
+	test_arena_meld()